@@ -5,6 +5,24 @@ import pydeck as pdk
 import plotly.express as px
 import plotly.graph_objects as go
 
+import uuid
+
+import charts
+import cube
+import export
+import pareto
+import perf
+import pipeline
+import snapshots
+from dataset_cache import memory_report
+from filters import FilterIndex, FilterState
+from spatial import SpatialIndex
+from cannibalization import PART_CAPTEE, NeighbourGraph, ServedModel
+from scoring import compute_revenue
+from map_layers import POINTS_ZOOM, map_data
+from territories import allocate_territories, phase_totals
+from deployment import COUT_FRANCHISE, optimize_deployment
+
 # Configuration de la page
 st.set_page_config(
 	page_title="Analyse Marché - Nettoyage Poubelles",
@@ -75,100 +93,77 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Colonnes du tableau de résultats (et de l'export "Colonnes affichées")
+DISPLAY_COLUMNS = {
+	'nom': 'Ville', 'codeInsee': 'Code INSEE', 'departement': 'Département',
+	'region': 'Région', 'priorite': 'Priorité', 'score': 'Score',
+	'revenuAnnuel': 'Revenu Annuel (€)', 'clientsPotentiels': 'Clients',
+	'population': 'Population', 'pct_maison': '% Maisons',
+	'tauxProprietaires': '% Proprio', 'plus60ans': '% 60+', 'saturation': 'Saturation',
+}
+
 # Données des villes
-@st.cache_data
+@st.cache_resource
 def load_data():
-	df = pd.read_csv('data.csv', sep=';')
-	return df
-
-def calculate_score(row):
-	"""Calcul du score pondéré adapté au nettoyage de poubelles - favorise les périphéries"""
-	
-	# Pondérations adaptées (périphéries > centres-villes)
-	poids_maisons = 0.40        # AUGMENTÉ - Critère principal pour périphéries
-	poids_proprio = 0.25        # Stabilité clientèle
-	poids_pop60 = 0.15          # RÉDUIT - Moins critique que le type d'habitat
-	poids_revenu = 0.10         # Pouvoir d'achat
-	poids_familles = 0.10       # AUGMENTÉ - Familles en périphérie
-	# Population totale supprimée - favorise petites villes périphériques
-    
-	# Calcul des scores individuels
-	score_maisons = min((row['pct_maison'] / 90) * 100, 100)
-	score_proprio = min((row['tauxProprietaires'] / 70) * 100, 100)
-	score_pop60 = min((row['plus60ans'] / 35) * 100, 100)
-	score_revenu = min((row['revenuMedian'] / 27000) * 100, 100)
-	score_familles = min((row['pct_30_44'] / 25) * 100, 100)
-    
-	# BONUS PÉRIPHÉRIE : Favorise zones pavillonnaires (>70% maisons)
-	bonus_peripherie = 0
-	if row['pct_maison'] > 80:
-		bonus_peripherie = 15  # Bonus important pour zones très pavillonnaires
-	elif row['pct_maison'] > 70:
-		bonus_peripherie = 10  # Bonus moyen
-	elif row['pct_maison'] > 60:
-		bonus_peripherie = 5   # Petit bonus
-    
-	# PÉNALITÉ CENTRE-VILLE : Pénalise zones denses (>60% appartements)
-	penalite_centre = 0
-	if row['pct_appartement'] > 70:
-		penalite_centre = -20  # Forte pénalité pour centres très denses
-	elif row['pct_appartement'] > 60:
-		penalite_centre = -15  # Pénalité moyenne
-	elif row['pct_appartement'] > 50:
-		penalite_centre = -10  # Petite pénalité
-    
-	# PÉNALITÉ GRANDE VILLE : Les très grandes villes = centres denses
-	penalite_grande_ville = 0
-	if row['population'] > 100000:
-		penalite_grande_ville = -10  # Grandes villes = centres denses
-	elif row['population'] > 50000:
-		penalite_grande_ville = -5   # Villes moyennes
-    
-	# Score total pondéré avec bonus/pénalités
-	score_base = (
-		score_maisons * poids_maisons +
-		score_proprio * poids_proprio +
-		score_pop60 * poids_pop60 +
-		score_revenu * poids_revenu +
-		score_familles * poids_familles
-	)
-    
-	score_total = score_base + bonus_peripherie + penalite_centre + penalite_grande_ville
-    
-	# Limiter entre 0 et 100
-	score_total = max(0, min(100, score_total))
-    
-	return round(score_total)
-
-def calculate_foyers(row):
-	"""Calcul des foyers et clients potentiels"""
-	nb_personnes_60plus = round((row['population'] * row['plus60ans']) / 100)
-	foyers_potentiels = round(nb_personnes_60plus / 2.2)
-	taux_penetration = 0.15 if row['zoneChalandise'] >= 300 else 0.10
-	clients_potentiels = round(foyers_potentiels * taux_penetration)
-    
-	return pd.Series({
-		'foyersPotentiels': foyers_potentiels,
-		'clientsPotentiels': clients_potentiels,
-		'personnes60plus': nb_personnes_60plus
-	})
-
-def calculate_revenue(row):
-	"""Calcul du revenu annuel estimé"""
-	prix_mensuel = 15  # €/mois par client
-	revenu_annuel = row['clientsPotentiels'] * prix_mensuel * 12
-	return revenu_annuel
-
-def get_priority_level(score, revenue):
-	"""Détermination du niveau de priorité"""
-	if score >= 75 and revenue >= 50000:
-		return "A"
-	elif score >= 60 and revenue >= 30000:
-		return "B"
-	elif score >= 45:
-		return "C"
-	else:
-		return "D"
+	# Table scorée projetée en mémoire depuis le cache disque : une seule copie en lecture seule
+	# partagée par toutes les sessions (reconstruite si data.csv ou les paramètres changent)
+	return pipeline.load_shared('data.csv')
+
+@st.cache_resource
+def get_filter_index():
+	"""Index des filtres, construit une fois et partagé par toutes les sessions"""
+	return FilterIndex(load_data())
+
+@st.cache_resource
+def get_cube():
+	"""Cube d'agrégats (région × département × priorité × tranches), partagé par toutes les sessions"""
+	return cube.AggregateCube(get_filter_index().df)
+
+@st.cache_resource
+def get_figure_cache():
+	"""Figures Plotly des onglets d'analyse, partagées par toutes les sessions (LRU borné en taille)"""
+	return charts.FigureCache(max_bytes=32 * 1024 * 1024)
+
+@st.cache_data(max_entries=16)
+def build_export(filter_state, sort_column, ascending, fmt, full):
+	"""Fichier d'export des résultats filtrés, généré par blocs et mis en cache par état des filtres"""
+	index = get_filter_index()
+	rows = index.sorted_rows(filter_state, sort_column, ascending)
+	return export.export_bytes(index.df, rows, fmt, columns=None if full else DISPLAY_COLUMNS, full=full)
+
+@st.cache_data(max_entries=32)
+def build_pareto(filter_state, metrics, n_layers):
+	"""Couches de Pareto (non dominées) des communes filtrées : effectifs par couche et meilleures lignes à afficher"""
+	index = get_filter_index()
+	return pareto.pareto_selection(index.df.iloc[index.rows(filter_state)], list(metrics), n_layers, limit=pareto.DISPLAY_LIMIT)
+
+@st.cache_resource
+def get_spatial_index():
+	"""Index spatial (grille lat/lon) des communes, partagé par toutes les sessions"""
+	return SpatialIndex.from_frame(get_filter_index().df)
+
+@st.cache_resource
+def get_neighbour_graph():
+	"""Graphe des communes voisines (zones de chalandise mutuelles), partagé par toutes les sessions"""
+	return NeighbourGraph.from_frame(get_filter_index().df)
+
+@st.cache_data(max_entries=64)
+def build_map_data(filter_state, zoom, center):
+	"""Cellules agrégées (ou points visibles) pour un état de filtres et un zoom"""
+	index = get_filter_index()
+	return map_data(index.df.iloc[index.rows(filter_state)], zoom, center)
+
+@st.cache_data(max_entries=4)
+def load_snapshot_changes(directory, old_version, new_version):
+	"""Communes nouvelles, supprimées ou dont la priorité / le revenu a changé entre deux versions des données"""
+	return snapshots.diff_versions(old_version, new_version, directory)
+
+@st.cache_data(max_entries=32)
+def build_territories(filter_state):
+	"""Territoires de franchise sans chevauchement pour un état de filtres"""
+	index = get_filter_index()
+	territories, _ = allocate_territories(index.df.iloc[index.rows(filter_state)])
+	return territories
 
 def get_priority_label(priority):
 	"""Label complet de priorité"""
@@ -180,16 +175,6 @@ def get_priority_label(priority):
 	}
 	return labels.get(priority, "N/A")
 
-def get_saturation(row):
-	"""Indicateur de saturation marché"""
-	ratio = row['clientsPotentiels'] / row['population'] if row['population'] > 0 else 0
-	if ratio > 0.05:
-		return "🟢 Fort Potentiel"
-	elif ratio > 0.03:
-		return "🟡 Potentiel Moyen"
-	else:
-		return "🔴 Faible Potentiel"
-
 # Fonctions utilitaires
 def get_score_emoji(score):
 	if score >= 80: return "🟢"
@@ -202,18 +187,20 @@ def score_to_rgb(score):
 	green = int(255 * score / 100)
 	return [red, green, 0, 160]
 
-# Chargement des données
-df = load_data()
+# Instrumentation par étape (variable d'environnement ANALYSE_PERF ; sans effet sinon)
+perf_run = perf.start_run(st.session_state.setdefault('perf_session', uuid.uuid4().hex[:8]))
+if perf.PROFILING and st.session_state.pop('perf_profile_next', False):
+	perf_run.profile()
 
-# Calcul du score et des foyers
-df['score'] = df.apply(calculate_score, axis=1)
-df[['foyersPotentiels', 'clientsPotentiels', 'personnes60plus']] = df.apply(calculate_foyers, axis=1)
-df['revenuAnnuel'] = df.apply(calculate_revenue, axis=1)
-df['priorite'] = df.apply(lambda row: get_priority_level(row['score'], row['revenuAnnuel']), axis=1)
-df['saturation'] = df.apply(get_saturation, axis=1)
+try:
+	# Chargement des données (déjà scorées) et de l'index des filtres
+	with perf_run.stage("load_shared") as stage:
+		filter_index = get_filter_index()
+		df = filter_index.df
+		stage.set(rows=len(df))
 
-# Header professionnel
-st.markdown("""
+	# Header professionnel
+	st.markdown("""
 <div class="main-header">
 	<h1>🗑️ Analyse de Marché - Nettoyage de Poubelles</h1>
 	<p style="font-size: 1.2rem; margin-top: 0.5rem;">Outil d'aide à la décision pour franchisés</p>
@@ -221,254 +208,522 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Sidebar - Filtres
-st.sidebar.header("🔍 Filtres de Recherche")
-
-search_term = st.sidebar.text_input("🔎 Rechercher", placeholder="Ville ou département...")
-
-region_filter = st.sidebar.selectbox(
-	"Région",
-	["Toutes"] + sorted(df['region'].unique().tolist())
-)
-
-priority_filter = st.sidebar.multiselect(
-	"Niveau de Priorité",
-	["A", "B", "C", "D"],
-	default=["A", "B"]
-)
-
-min_population = st.sidebar.number_input(
-	"Population minimale",
-	min_value=0,
-	max_value=int(df['population'].max()),
-	value=3000,
-	step=1000
-)
-
-min_revenue = st.sidebar.number_input(
-	"Revenu annuel minimum (€)",
-	min_value=0,
-	max_value=int(df['revenuAnnuel'].max()),
-	value=20000,
-	step=5000
-)
-
-min_score = st.sidebar.slider(
-	"Score minimal",
-	min_value=0,
-	max_value=100,
-	value=50,
-	step=5
-)
-
-# Application des filtres
-filtered_df = df.copy()
+	# Sidebar - Filtres
+	st.sidebar.header("🔍 Filtres de Recherche")
 
-if search_term:
-	filtered_df = filtered_df[
-		filtered_df['nom'].str.contains(search_term, case=False, na=False) |
-		filtered_df['departement'].str.contains(search_term, case=False, na=False)
-	]
+	search_term = st.sidebar.text_input("🔎 Rechercher", placeholder="Ville, département ou code INSEE...")
 
-if region_filter != "Toutes":
-	filtered_df = filtered_df[filtered_df['region'] == region_filter]
+	region_filter = st.sidebar.selectbox(
+		"Région",
+		["Toutes"] + sorted(df['region'].unique().tolist())
+	)
 
-if priority_filter:
-	filtered_df = filtered_df[filtered_df['priorite'].isin(priority_filter)]
+	priority_filter = st.sidebar.multiselect(
+		"Niveau de Priorité",
+		["A", "B", "C", "D"],
+		default=["A", "B"]
+	)
 
-filtered_df = filtered_df[filtered_df['population'] >= min_population]
-filtered_df = filtered_df[filtered_df['revenuAnnuel'] >= min_revenue]
-filtered_df = filtered_df[filtered_df['score'] >= min_score]
+	min_population = st.sidebar.number_input(
+		"Population minimale",
+		min_value=0,
+		max_value=int(df['population'].max()),
+		value=3000,
+		step=1000
+	)
 
-# Tri
-sort_by = st.sidebar.selectbox(
-	"Trier par",
-	["Revenu Annuel", "Score", "Clients potentiels", "Population totale"],
-	index=0
-)
+	min_revenue = st.sidebar.number_input(
+		"Revenu annuel minimum (€)",
+		min_value=0,
+		max_value=int(df['revenuAnnuel'].max()),
+		value=20000,
+		step=5000
+	)
 
-sort_order = st.sidebar.radio("Ordre", ["Décroissant", "Croissant"])
+	min_score = st.sidebar.slider(
+		"Score minimal",
+		min_value=0,
+		max_value=100,
+		value=50,
+		step=5
+	)
 
-sort_mapping = {
-	"Revenu Annuel": "revenuAnnuel",
-	"Score": "score",
-	"Clients potentiels": "clientsPotentiels",
-	"Population totale": "population"
-}
+	# Tri
+	sort_by = st.sidebar.selectbox(
+		"Trier par",
+		["Revenu Annuel", "Score", "Clients potentiels", "Population totale"],
+		index=0
+	)
 
-filtered_df = filtered_df.sort_values(
-	by=sort_mapping[sort_by],
-	ascending=(sort_order == "Croissant")
-)
+	sort_order = st.sidebar.radio("Ordre", ["Décroissant", "Croissant"])
 
-# Dashboard principal
-st.subheader("📊 Vue d'Ensemble du Marché")
+	sort_mapping = {
+		"Revenu Annuel": "revenuAnnuel",
+		"Score": "score",
+		"Clients potentiels": "clientsPotentiels",
+		"Population totale": "population"
+	}
 
-col1, col2, col3, col4, col5 = st.columns(5)
+	# Application des filtres (index partagé, seules les lignes retenues sont extraites)
+	filter_state = FilterState(
+		search=search_term,
+		region=None if region_filter == "Toutes" else region_filter,
+		priorities=tuple(priority_filter),
+		min_population=min_population,
+		min_revenue=min_revenue,
+		min_score=min_score,
+	)
+	sort_column = sort_mapping[sort_by]
+	sort_ascending = sort_order == "Croissant"
+	with perf_run.stage("filter_count") as stage:
+		n_matches = filter_index.count(filter_state)
+		stage.set(rows=n_matches)
+
+	# Dashboard principal
+	st.subheader("📊 Vue d'Ensemble du Marché")
+
+	col1, col2, col3, col4, col5 = st.columns(5)
+	# KPIs et graphiques agrégés depuis le cube (balayage des seules cellules de bord)
+	with perf_run.stage("aggregate_cube") as stage:
+		if filter_state.search:
+			summary = get_cube().summarize_rows(filter_index.rows(filter_state))
+		else:
+			summary = get_cube().summary(filter_state)
+		metrics = cube.overview(summary)
+		stage.set(payload=summary)
 
-with col1:
-	st.metric("🏙️ Villes Sélectionnées", f"{len(filtered_df):,}")
+	with col1:
+		st.metric("🏙️ Villes Sélectionnées", f"{metrics['villes']:,}")
 
-with col2:
-	avg_revenue = filtered_df['revenuAnnuel'].mean() if len(filtered_df) > 0 else 0
-	st.metric("💰 Revenu Moyen", f"{avg_revenue:,.0f} €/an")
+	with col2:
+		st.metric("💰 Revenu Moyen", f"{metrics['revenuMoyen']:,.0f} €/an")
 
-with col3:
-	total_revenue = filtered_df['revenuAnnuel'].sum()
-	st.metric("💵 Revenu Total", f"{total_revenue:,.0f} €/an")
+	with col3:
+		st.metric("💵 Revenu Total", f"{metrics['revenuTotal']:,.0f} €/an")
 
-with col4:
-	priority_a_count = len(filtered_df[filtered_df['priorite'] == 'A'])
-	st.metric("🟢 Villes Priorité A", f"{priority_a_count:,}")
+	with col4:
+		st.metric("🟢 Villes Priorité A", f"{metrics['villesPrioriteA']:,}")
 
-with col5:
-	total_clients = filtered_df['clientsPotentiels'].sum()
-	st.metric("👥 Clients Totaux", f"{total_clients:,}")
+	with col5:
+		st.metric("👥 Clients Totaux", f"{metrics['clientsTotaux']:,}")
 
-st.markdown("---")
+	st.markdown("---")
 
-# Graphiques visuels
-if len(filtered_df) > 0:
-	st.subheader("📈 Analyse Visuelle")
+	# Graphiques visuels : seule la section affichée est calculée, figures partagées via un LRU
+	if n_matches > 0:
+		st.subheader("📈 Analyse Visuelle")
 	
-	tab1, tab2, tab3 = st.tabs(["💰 Top Revenus", "🎯 Distribution Priorités", "🗺️ Analyse Régionale"])
-	
-	with tab1:
-		st.markdown("### Top 20 Villes par Revenu Annuel Potentiel")
-		top_revenue = filtered_df.nlargest(20, 'revenuAnnuel')[['nom', 'revenuAnnuel', 'clientsPotentiels', 'priorite']].reset_index(drop=True)
-		
-		fig = px.bar(
-			top_revenue,
-			x='nom',
-			y='revenuAnnuel',
-			color='priorite',
-			color_discrete_map={'A': '#10b981', 'B': '#3b82f6', 'C': '#f59e0b', 'D': '#ef4444'},
-			title="Revenu Annuel Potentiel par Ville",
-			labels={'revenuAnnuel': 'Revenu Annuel (€)', 'nom': 'Ville'},
-			height=500
+		section = st.radio(
+			"Section",
+			["💰 Top Revenus", "🎯 Distribution Priorités", "🗺️ Analyse Régionale"],
+			horizontal=True,
+			label_visibility="collapsed",
 		)
-		fig.update_layout(showlegend=True, xaxis_tickangle=-45)
-		st.plotly_chart(fig, use_container_width=True)
+		figure_cache = get_figure_cache()
+		state_key = filter_state.key()
 	
-	with tab2:
-		st.markdown("### Distribution des Villes par Niveau de Priorité")
-		priority_counts = filtered_df['priorite'].value_counts().reset_index()
-		priority_counts.columns = ['Priorité', 'Nombre']
-		
-		fig = px.pie(
-			priority_counts,
-			values='Nombre',
-			names='Priorité',
-			color='Priorité',
-			color_discrete_map={'A': '#10b981', 'B': '#3b82f6', 'C': '#f59e0b', 'D': '#ef4444'},
-			title="Répartition des Villes par Priorité",
-			height=500
-		)
-		st.plotly_chart(fig, use_container_width=True)
+		if section == "💰 Top Revenus":
+			st.markdown("### Top 20 Villes par Revenu Annuel Potentiel")
+			with perf_run.stage("chart_top_revenue") as stage:
+				fig = figure_cache.get(
+					("top_revenue", state_key),
+					lambda: charts.top_revenue_figure(pipeline.top_revenue(df.iloc[filter_index.rows(filter_state)], 20)),
+				)
+				stage.set(payload=fig)
+			with perf_run.stage("render_chart"):
+				st.plotly_chart(fig, use_container_width=True)
+	
+		elif section == "🎯 Distribution Priorités":
+			st.markdown("### Distribution des Villes par Niveau de Priorité")
+			with perf_run.stage("chart_priorities") as stage:
+				priority_counts = cube.priority_counts(summary)
+				fig = figure_cache.get(("priorities", state_key), lambda: charts.priority_figure(priority_counts))
+				stage.set(payload=fig)
+			with perf_run.stage("render_chart"):
+				st.plotly_chart(fig, use_container_width=True)
 		
-		col1, col2 = st.columns(2)
+			col1, col2 = st.columns(2)
+			with col1:
+				st.dataframe(priority_counts, use_container_width=True)
+			with col2:
+				priority_revenue = cube.priority_revenue(summary)
+				priority_revenue['Revenu Total (€)'] = priority_revenue['Revenu Total (€)'].apply(lambda x: f"{x:,.0f} €")
+				st.dataframe(priority_revenue, use_container_width=True)
+	
+		else:
+			st.markdown("### Analyse par Région")
+			with perf_run.stage("chart_regions") as stage:
+				fig = figure_cache.get(("regions", state_key), lambda: charts.region_figure(cube.region_stats(summary)))
+				stage.set(payload=fig)
+			with perf_run.stage("render_chart"):
+				st.plotly_chart(fig, use_container_width=True)
+
+	st.markdown("---")
+
+	# Sélection multi-critères : communes qu'aucune autre ne bat sur tous les critères à la fois
+	if n_matches > 0:
+		st.subheader("🏆 Sélection Multi-critères (Pareto)")
+	
+		col1, col2 = st.columns([3, 1])
 		with col1:
-			st.dataframe(priority_counts, use_container_width=True)
+			pareto_labels = st.multiselect(
+				"Critères à maximiser",
+				list(pareto.OBJECTIVES.values()),
+				default=["Score", "Revenu annuel", "Clients potentiels"],
+				max_selections=pareto.MAX_OBJECTIVES,
+			)
 		with col2:
-			priority_revenue = filtered_df.groupby('priorite')['revenuAnnuel'].sum().reset_index()
-			priority_revenue.columns = ['Priorité', 'Revenu Total (€)']
-			priority_revenue['Revenu Total (€)'] = priority_revenue['Revenu Total (€)'].apply(lambda x: f"{x:,.0f} €")
-			st.dataframe(priority_revenue, use_container_width=True)
-	
-	with tab3:
-		st.markdown("### Analyse par Région")
-		region_stats = filtered_df.groupby('region').agg({
-			'revenuAnnuel': 'sum',
-			'clientsPotentiels': 'sum',
-			'nom': 'count'
-		}).reset_index()
-		region_stats.columns = ['Région', 'Revenu Total', 'Clients Totaux', 'Nb Villes']
-		region_stats = region_stats.sort_values('Revenu Total', ascending=False)
-		
-		fig = px.bar(
-			region_stats.head(15),
-			x='Région',
-			y='Revenu Total',
-			title="Top 15 Régions par Revenu Potentiel",
-			labels={'Revenu Total': 'Revenu Annuel Total (€)'},
-			height=500
-		)
-		fig.update_layout(xaxis_tickangle=-45)
-		st.plotly_chart(fig, use_container_width=True)
-
-st.markdown("---")
-
-# Plan de déploiement
-if len(filtered_df) > 0:
-	st.subheader("🚀 Plan de Déploiement Recommandé")
+			pareto_depth = st.slider("Couches", min_value=1, max_value=10, value=3)
+		pareto_metrics = tuple(c for c, label in pareto.OBJECTIVES.items() if label in pareto_labels)
 	
-	priority_a = filtered_df[filtered_df['priorite'] == 'A']
-	priority_b = filtered_df[filtered_df['priorite'] == 'B']
-	priority_c = filtered_df[filtered_df['priorite'] == 'C']
+		if len(pareto_metrics) < 2:
+			st.info("Choisissez au moins deux critères")
+		else:
+			with perf_run.stage("pareto_layers") as stage:
+				pareto_counts, pareto_df = build_pareto(filter_state, pareto_metrics, pareto_depth)
+				stage.set(rows=len(pareto_df), payload=pareto_df)
+			counts = pareto_counts.set_index('Couche')['Communes']
+			st.caption(
+				f"Couche 1 : {counts.get(1, 0):,} communes non dominées parmi {n_matches:,} ; "
+				+ " · ".join(f"couche {k} : {v:,}" for k, v in counts.items() if k > 1)
+			)
+			if counts.sum() > len(pareto_df):
+				st.caption(
+					f"Affichage limité aux {len(pareto_df):,} meilleures communes sur {counts.sum():,} "
+					f"(par couche, puis {pareto.OBJECTIVES[pareto_metrics[0]].lower()})"
+				)
+			pareto_labels_map = {**DISPLAY_COLUMNS, **pareto.OBJECTIVES, 'couchePareto': 'Couche'}
+			fig = px.scatter(
+				pareto_df,
+				x=pareto_metrics[0],
+				y=pareto_metrics[1],
+				color=pareto_df['couchePareto'].astype(str),
+				hover_name='nom',
+				hover_data=list(pareto_metrics[2:]),
+				labels=pareto_labels_map,
+				title=f"Front de Pareto : {pareto.OBJECTIVES[pareto_metrics[0]]} × {pareto.OBJECTIVES[pareto_metrics[1]]}",
+				height=450,
+			)
+			st.plotly_chart(fig, use_container_width=True)
+			pareto_columns = ['couchePareto', 'nom', 'departement', 'priorite', *pareto_metrics]
+			st.dataframe(
+				pareto_df[list(dict.fromkeys(pareto_columns))].rename(columns=pareto_labels_map),
+				use_container_width=True,
+				height=300,
+			)
+
+	st.markdown("---")
+
+	# Analyse de zone (communes dans un rayon autour d'une ville)
+	if n_matches > 0:
+		st.subheader("📍 Analyse de Zone")
 	
-	col1, col2, col3 = st.columns(3)
+		with perf_run.stage("zone_candidates") as stage:
+			zone_rows = filter_index.top_rows(filter_state, sort_column, sort_ascending, 500)
+			zone_candidates = df.iloc[zone_rows]
+			zone_labels = (zone_candidates['nom'] + " (" + zone_candidates['departement'].astype(str) + ")").tolist()
+			stage.set(rows=len(zone_candidates), payload=zone_candidates)
 	
-	with col1:
-		st.markdown("### 📅 Phase 1 (0-6 mois)")
-		st.markdown(f"**Villes Priorité A** : {len(priority_a)}")
-		st.markdown(f"**Investissement** : {len(priority_a) * 25000:,} €")
-		st.markdown(f"**Revenu Annuel** : {priority_a['revenuAnnuel'].sum():,.0f} €")
-		st.markdown(f"**ROI Estimé** : 12-18 mois")
+		col1, col2 = st.columns([2, 1])
+		with col1:
+			zone_label = st.selectbox("Ville centre", zone_labels)
+		with col2:
+			zone_radius = st.slider("Rayon (km)", min_value=5, max_value=100, value=20, step=5)
 	
-	with col2:
-		st.markdown("### 📅 Phase 2 (6-12 mois)")
-		st.markdown(f"**Villes Priorité B** : {len(priority_b)}")
-		st.markdown(f"**Investissement** : {len(priority_b) * 25000:,} €")
-		st.markdown(f"**Revenu Annuel** : {priority_b['revenuAnnuel'].sum():,.0f} €")
-		st.markdown(f"**ROI Estimé** : 18-24 mois")
+		zone_city = zone_candidates.iloc[zone_labels.index(zone_label)]
+		with perf_run.stage("zone_catchment"):
+			zone = get_spatial_index().catchment(zone_city['lat'], zone_city['lon'], zone_radius).iloc[0]
 	
-	with col3:
-		st.markdown("### 📅 Phase 3 (12-24 mois)")
-		st.markdown(f"**Villes Priorité C** : {len(priority_c)}")
-		st.markdown(f"**Investissement** : {len(priority_c) * 25000:,} €")
-		st.markdown(f"**Revenu Annuel** : {priority_c['revenuAnnuel'].sum():,.0f} €")
-		st.markdown(f"**ROI Estimé** : 24-36 mois")
-
-st.markdown("---")
-
-# Tableau des résultats
-st.subheader("📋 Résultats Détaillés")
-
-if len(filtered_df) > 0:
-	display_df = filtered_df[[
-		'nom', 'departement', 'region', 'priorite', 'score', 
-		'revenuAnnuel', 'clientsPotentiels', 'population',
-		'pct_maison', 'tauxProprietaires', 'plus60ans', 'saturation'
-	]].copy()
-	
-	display_df.columns = [
-		'Ville', 'Département', 'Région', 'Priorité', 'Score',
-		'Revenu Annuel (€)', 'Clients', 'Population',
-		'% Maisons', '% Proprio', '% 60+', 'Saturation'
-	]
-	
-	# Affichage sans style si trop de lignes
-	if len(display_df) > 5000:
-		st.info(f"⚠️ Affichage de {len(display_df):,} villes. Le style est désactivé pour améliorer les performances.")
-		st.dataframe(display_df, use_container_width=True, height=600)
+		col1, col2, col3, col4 = st.columns(4)
+		with col1:
+			st.metric("🏘️ Communes dans la zone", f"{int(zone['nbCommunes']):,}")
+		with col2:
+			st.metric("👪 Population", f"{zone['population']:,.0f}")
+		with col3:
+			st.metric("👥 Clients potentiels", f"{zone['clientsPotentiels']:,.0f}")
+		with col4:
+			st.metric("💰 Revenu annuel", f"{zone['revenuAnnuel']:,.0f} €")
+	
+		# Carte : agrégats par cellule calculés côté serveur, communes individuelles en zoom proche
+		map_zoom = st.slider("Zoom de la carte", min_value=4, max_value=12, value=6)
+		map_center = (zone_city['lat'], zone_city['lon'])
+		with perf_run.stage("map_data") as stage:
+			map_kind, map_df = build_map_data(filter_state, map_zoom, map_center if map_zoom >= POINTS_ZOOM else None)
+			stage.set(rows=len(map_df), payload=map_df)
+	
+		if map_kind == "cells":
+			map_layer = pdk.Layer(
+				"PolygonLayer",
+				map_df,
+				get_polygon="polygon",
+				get_fill_color="color",
+				stroked=False,
+				pickable=True,
+			)
+			map_tooltip = {"text": "{nbCommunes} communes\nRevenu total : {revenuAnnuel} €\nClients : {clientsPotentiels}\nScore moyen : {scoreMoyen}"}
+		else:
+			map_layer = pdk.Layer(
+				"ScatterplotLayer",
+				map_df,
+				get_position=["lon", "lat"],
+				get_fill_color="color",
+				get_radius=500,
+				radius_min_pixels=3,
+				pickable=True,
+			)
+			map_tooltip = {"text": "{nom} ({departement})\nPriorité {priorite} - Score {score}\nRevenu : {revenuAnnuel} €"}
+	
+		with perf_run.stage("render_map"):
+			st.pydeck_chart(pdk.Deck(
+				layers=[map_layer],
+				initial_view_state=pdk.ViewState(latitude=map_center[0], longitude=map_center[1], zoom=map_zoom),
+				tooltip=map_tooltip,
+			))
+		st.caption(f"{len(map_df):,} {'cellules agrégées' if map_kind == 'cells' else 'communes'} envoyées à la carte")
+
+	st.markdown("---")
+
+	# Plan de déploiement
+	if n_matches > 0:
+		st.subheader("🚀 Plan de Déploiement Recommandé")
+	
+		# Territoires sans chevauchement : chaque commune n'est comptée que dans un seul territoire
+		with perf_run.stage("territories") as stage:
+			territories = build_territories(filter_state)
+			phases = phase_totals(territories)
+			stage.set(rows=len(territories), payload=territories)
+	
+		col1, col2, col3 = st.columns(3)
+	
+		with col1:
+			st.markdown("### 📅 Phase 1 (0-6 mois)")
+			st.markdown(f"**Territoires (siège A)** : {phases.at['A', 'nbTerritoires']} ({phases.at['A', 'nbCommunes']} communes)")
+			st.markdown(f"**Investissement** : {phases.at['A', 'nbTerritoires'] * 25000:,} €")
+			st.markdown(f"**Revenu Annuel** : {phases.at['A', 'revenuAnnuel']:,.0f} €")
+			st.markdown(f"**Clients** : {phases.at['A', 'clientsPotentiels']:,}")
+			st.markdown(f"**ROI Estimé** : 12-18 mois")
+	
+		with col2:
+			st.markdown("### 📅 Phase 2 (6-12 mois)")
+			st.markdown(f"**Territoires (siège B)** : {phases.at['B', 'nbTerritoires']} ({phases.at['B', 'nbCommunes']} communes)")
+			st.markdown(f"**Investissement** : {phases.at['B', 'nbTerritoires'] * 25000:,} €")
+			st.markdown(f"**Revenu Annuel** : {phases.at['B', 'revenuAnnuel']:,.0f} €")
+			st.markdown(f"**Clients** : {phases.at['B', 'clientsPotentiels']:,}")
+			st.markdown(f"**ROI Estimé** : 18-24 mois")
+	
+		with col3:
+			st.markdown("### 📅 Phase 3 (12-24 mois)")
+			st.markdown(f"**Territoires (siège C)** : {phases.at['C', 'nbTerritoires']} ({phases.at['C', 'nbCommunes']} communes)")
+			st.markdown(f"**Investissement** : {phases.at['C', 'nbTerritoires'] * 25000:,} €")
+			st.markdown(f"**Revenu Annuel** : {phases.at['C', 'revenuAnnuel']:,.0f} €")
+			st.markdown(f"**Clients** : {phases.at['C', 'clientsPotentiels']:,}")
+			st.markdown(f"**ROI Estimé** : 24-36 mois")
+	
+		with st.expander(f"🗺️ Détail des {len(territories):,} territoires", expanded=False):
+			st.dataframe(
+				territories[['siege', 'departement', 'priorite', 'nbCommunes', 'population', 'clientsPotentiels', 'revenuAnnuel', 'rayonKm']],
+				use_container_width=True,
+				height=400
+			)
+
+		with st.expander("💶 Optimisation sous contrainte de budget", expanded=False):
+			col1, col2, col3 = st.columns(3)
+			with col1:
+				budget_phase1 = st.number_input("Budget Phase 1 (€)", min_value=0, value=1000000, step=25000)
+			with col2:
+				budget_phase2 = st.number_input("Budget Phase 2 (€)", min_value=0, value=1000000, step=25000)
+			with col3:
+				budget_phase3 = st.number_input("Budget Phase 3 (€)", min_value=0, value=1000000, step=25000)
+		
+			col1, col2, col3 = st.columns(3)
+			with col1:
+				budget_total = st.number_input("Budget total (€)", min_value=0, value=3000000, step=50000)
+			with col2:
+				cout_fixe = st.number_input("Coût fixe par territoire (€)", min_value=1000, value=COUT_FRANCHISE, step=1000)
+			with col3:
+				cout_commune = st.number_input("Coût par commune desservie (€)", min_value=0, value=0, step=100)
+		
+			plan, plan_summary = optimize_deployment(
+				territories,
+				budget_total,
+				[budget_phase1, budget_phase2, budget_phase3],
+				cost=cout_fixe + cout_commune * territories['nbCommunes'].to_numpy()
+			)
+		
+			col1, col2, col3 = st.columns(3)
+			for col, (_, phase) in zip((col1, col2, col3), plan_summary.iterrows()):
+				with col:
+					st.markdown(f"### {phase['phase']}")
+					st.markdown(f"**Ouvertures** : {phase['nbOuvertures']}")
+					st.markdown(f"**Investissement** : {phase['investissement']:,.0f} € / {phase['budget']:,.0f} €")
+					st.markdown(f"**Revenu Annuel** : {phase['revenuAnnuel']:,.0f} € (borne max {phase['borneSuperieure']:,.0f} €)")
+					st.markdown(f"**Revenu marginal** : {phase['revenuMarginalParEuro']:.2f} € par € investi")
+		
+			if len(plan) > 0:
+				fig = px.line(
+					plan,
+					x='coutCumule',
+					y='revenuCumule',
+					color='phase',
+					hover_name='siege',
+					title="Revenu annuel cumulé selon l'investissement",
+					labels={'coutCumule': 'Investissement cumulé (€)', 'revenuCumule': 'Revenu annuel cumulé (€)'},
+					height=400
+				)
+				st.plotly_chart(fig, use_container_width=True)
+				st.dataframe(
+					plan[['rang', 'phase', 'siege', 'departement', 'priorite', 'nbCommunes', 'cout', 'revenuAnnuel', 'revenuParEuro']],
+					use_container_width=True,
+					height=300
+				)
+
+		# Cannibalisation : clients décotés pour la part de zone partagée avec des communes déjà desservies
+		with st.expander("🧩 Cannibalisation entre communes voisines", expanded=False):
+			served_labels = st.multiselect("Communes déjà desservies", zone_labels)
+			served_rows = zone_rows[[zone_labels.index(label) for label in served_labels]]
+		
+			if len(served_rows) == 0 and 'served_model' not in st.session_state:
+				st.info("Sélectionnez les communes déjà desservies pour décoter les clients de leurs voisines")
+			else:
+				# Modèle propre à la session sur le graphe partagé : seules les communes ajoutées/retirées sont recalculées
+				neighbour_graph = get_neighbour_graph()
+				served_model = st.session_state.get('served_model')
+				if served_model is None or served_model.graph is not neighbour_graph:
+					served_model = ServedModel(neighbour_graph, df['clientsPotentiels'].to_numpy())
+					st.session_state['served_model'] = served_model
+				with perf_run.stage("cannibalization") as stage:
+					served_model.set_served(served_rows)
+					filtered_rows = filter_index.rows(filter_state)
+					clients_bruts = df['clientsPotentiels'].to_numpy()[filtered_rows]
+					clients_ajustes = served_model.adjusted_clients()[filtered_rows]
+					stage.set(rows=len(filtered_rows))
+			
+				col1, col2, col3 = st.columns(3)
+				with col1:
+					st.metric("👥 Clients (sans voisinage)", f"{clients_bruts.sum():,.0f}")
+				with col2:
+					st.metric("🧩 Clients ajustés", f"{clients_ajustes.sum():,.0f}", f"{clients_ajustes.sum() - clients_bruts.sum():,.0f}")
+				with col3:
+					st.metric("💰 Revenu annuel ajusté", f"{compute_revenue(clients_ajustes.sum()):,.0f} €")
+			
+				unserved = ~served_model.served[filtered_rows]
+				best = np.argsort(-clients_ajustes[unserved], kind="stable")[:20]
+				best_rows = filtered_rows[unserved][best]
+				next_df = df.iloc[best_rows][['nom', 'departement', 'priorite', 'clientsPotentiels']].rename(columns=DISPLAY_COLUMNS)
+				next_df['Clients ajustés'] = np.rint(clients_ajustes[unserved][best]).astype(int)
+				next_df['Revenu ajusté'] = np.rint(compute_revenue(clients_ajustes[unserved][best])).astype(int)
+				next_df['Décote'] = (1 - served_model.kept_share()[best_rows]).round(3)
+				st.markdown("**Meilleures prochaines ouvertures (clients après cannibalisation)**")
+				st.dataframe(next_df, use_container_width=True)
+				st.caption(
+					f"Graphe de voisinage partagé : {neighbour_graph.n_edges:,} liaisons entre {neighbour_graph.n:,} communes "
+					f"({neighbour_graph.nbytes / 1e6:,.0f} Mo). Un voisin desservi conserve {PART_CAPTEE:.0%} des clients de la zone commune."
+				)
+
+	st.markdown("---")
+
+	# Tableau des résultats
+	st.subheader("📋 Résultats Détaillés")
+
+	if n_matches > 0:
+		# Pagination côté serveur : seule la page demandée est extraite (sélection top-k) et envoyée
+		col1, col2, col3 = st.columns([1, 1, 2])
+		with col1:
+			page_size = st.selectbox("Lignes par page", [25, 50, 100, 250], index=1)
+		n_pages = (n_matches + page_size - 1) // page_size
+		with col2:
+			page_number = min(int(st.number_input("Aller à la page", min_value=1, value=1, step=1)), n_pages)
+		with perf_run.stage("table_page") as stage:
+			page_rows = filter_index.page(filter_state, sort_column, sort_ascending, page_number - 1, page_size)
+			stage.set(rows=len(page_rows))
+		first = (page_number - 1) * page_size
+		with col3:
+			st.markdown(f"**{n_matches:,} communes** — lignes {first + 1:,} à {first + len(page_rows):,} (page {page_number} / {n_pages})")
+	
+		page_df = df.iloc[page_rows]
+		display_df = page_df[[c for c in DISPLAY_COLUMNS if c in page_df.columns]].rename(columns=DISPLAY_COLUMNS)
+		display_df.index = np.arange(first + 1, first + len(page_rows) + 1)
+		with perf_run.stage("render_table") as stage:
+			st.dataframe(display_df, use_container_width=True, height=600)
+			stage.set(rows=len(display_df), payload=display_df)
+	
+		# Export à la demande (généré par blocs, mis en cache par état des filtres)
+		col1, col2, col3 = st.columns([1, 2, 1])
+		with col1:
+			export_format = st.selectbox("Format d'export", [f.upper() for f in export.available_formats()]).lower()
+		with col2:
+			export_scope = st.radio("Colonnes exportées", ["Colonnes affichées", "Toutes les colonnes + détail du score"], horizontal=True)
+		export_request = (filter_state.key(), sort_column, sort_ascending, export_format, export_scope)
+		with col3:
+			if st.button("⚙️ Préparer l'export"):
+				st.session_state['export_request'] = export_request
+		if st.session_state.get('export_request') == export_request:
+			with perf_run.stage(f"export_{export_format}") as stage:
+				data = build_export(filter_state, sort_column, sort_ascending, export_format, export_scope != "Colonnes affichées")
+				stage.set(rows=n_matches, payload=data)
+			st.download_button(
+				label=f"📥 Télécharger les résultats ({export_format.upper()}, {n_matches:,} communes)",
+				data=data,
+				file_name=f'analyse_villes_franchise.{export_format}',
+				mime=export.MIME_TYPES[export_format],
+			)
 	else:
-		st.dataframe(display_df, use_container_width=True, height=600)
-	
-	# Bouton de téléchargement
-	csv = display_df.to_csv(index=False).encode('utf-8')
-	st.download_button(
-		label="📥 Télécharger les résultats (CSV)",
-		data=csv,
-		file_name='analyse_villes_franchise.csv',
-		mime='text/csv',
-	)
-else:
-	st.warning("⚠️ Aucune ville ne correspond aux critères de filtrage")
-
-# Méthodologie
-st.markdown("---")
-with st.expander("📊 Méthodologie & Calculs", expanded=False):
-	st.markdown("""
+		st.warning("⚠️ Aucune ville ne correspond aux critères de filtrage")
+
+	# Évolutions entre les deux dernières versions des données (python snapshots.py après chaque mise à jour)
+	snapshot_directory = snapshots.snapshot_dir('data.csv')
+	snapshot_entries = snapshots.list_snapshots(snapshot_directory)
+	if len(snapshot_entries) >= 2:
+		previous_entry, latest_entry = snapshot_entries[-2:]
+		with st.expander(f"🗂️ Évolutions des données (v{previous_entry['version']} → v{latest_entry['version']})", expanded=False):
+			with perf_run.stage("snapshot_changes") as stage:
+				changes = load_snapshot_changes(str(snapshot_directory), previous_entry['version'], latest_entry['version'])
+				stage.set(rows=len(changes), payload=changes)
+			counts = snapshots.change_counts(changes)
+			col1, col2, col3, col4 = st.columns(4)
+			with col1:
+				st.metric("🆕 Nouvelles communes", f"{counts['nouvelle']:,}")
+			with col2:
+				st.metric("🗑️ Communes supprimées", f"{counts['supprimée']:,}")
+			with col3:
+				st.metric("🔀 Changements de priorité", f"{counts['priorité']:,}")
+			with col4:
+				st.metric("💰 Écart de revenu net", f"{counts['ecartRevenu']:+,} €/an")
+		
+			if counts['priorité'] > 0:
+				st.markdown("**Changements de classe de priorité (avant → après)**")
+				st.dataframe(snapshots.priority_transitions(changes), use_container_width=True)
+			st.dataframe(changes, use_container_width=True, height=400)
+			st.download_button(
+				label=f"📥 Télécharger les changements (CSV, {len(changes):,} communes)",
+				data=changes.to_csv(index=False, sep=';').encode('utf-8-sig'),
+				file_name=f"changements_v{previous_entry['version']}_v{latest_entry['version']}.csv",
+				mime=export.MIME_TYPES['csv'],
+			)
+			st.caption(
+				f"Version du {latest_entry['created']} : {latest_entry['rescored']:,} communes recalculées sur "
+				f"{latest_entry['rows']:,} (les autres sont reprises de la version précédente) en {latest_entry['elapsed_s']:.2f} s."
+			)
+
+	# Empreinte mémoire (table partagée vs tables recréées à chaque session)
+	with st.expander("🧠 Mémoire", expanded=False):
+		session_frames = {}
+		if n_matches > 0:
+			session_frames = {'zone_candidates': zone_candidates, 'display_df (page)': display_df}
+		shared_report = memory_report({'df (partagée)': df})
+		session_report = memory_report(session_frames)
+		col1, col2 = st.columns(2)
+		with col1:
+			st.metric("Table partagée (une fois par instance)", f"{shared_report['octets'].sum() / 1e6:,.1f} Mo")
+		with col2:
+			st.metric("Par session (à chaque exécution)", f"{session_report['octets'].sum() / 1e6:,.1f} Mo")
+		st.dataframe(pd.concat([shared_report, session_report], ignore_index=True), use_container_width=True)
+		st.caption("La table partagée est projetée en mémoire depuis le cache disque, en lecture seule ; seules la page affichée et les villes proposées pour l'analyse de zone sont copiées pour la session.")
+
+	# Méthodologie
+	st.markdown("---")
+	with st.expander("📊 Méthodologie & Calculs", expanded=False):
+		st.markdown("""
 	### Scoring (0-100 points) - Optimisé pour Périphéries
 	
 	**Pondération adaptée (favorise banlieues/périphéries) :**
@@ -511,12 +766,33 @@ with st.expander("📊 Méthodologie & Calculs", expanded=False):
 	
 	### Investissement Franchise
 	
-	- **Coût par ville** : 25,000€ (équipement, marketing, formation)
+	- **Coût par territoire** : 25,000€ (équipement, marketing, formation)
+	- **Territoires** : chaque ville prioritaire (A, puis B, puis C, par revenu décroissant) regroupe les communes non encore attribuées dans sa zone de chalandise ; une commune n'appartient qu'à un seul territoire
 	- **ROI Priorité A** : 12-18 mois
 	- **ROI Priorité B** : 18-24 mois
 	- **ROI Priorité C** : 24-36 mois
 	""")
 
-# Footer
-st.markdown("---")
-st.markdown("💡 **Astuce** : Utilisez les filtres pour affiner votre stratégie de déploiement par région ou niveau de priorité")
\ No newline at end of file
+	# Footer
+	st.markdown("---")
+	st.markdown("💡 **Astuce** : Utilisez les filtres pour affiner votre stratégie de déploiement par région ou niveau de priorité")
+finally:
+	# Profileur arrêté et exécution journalisée même si Streamlit interrompt le script (rerun, stop, erreur)
+	perf_record = perf_run.finish()
+
+# Panneau de performance (visible seulement avec ANALYSE_PERF) : percentiles sur la session
+if perf_record is not None:
+	perf_history = st.session_state.setdefault('perf_history', [])
+	perf_history.append(perf_record)
+	del perf_history[:-200]
+	if 'profile' in perf_record:
+		st.session_state['perf_profile'] = perf_record['profile']
+	with st.expander("⏱️ Performance (debug)", expanded=False):
+		st.caption(f"Session {perf_record['session']} — {len(perf_history)} exécutions, dernière : {perf_record['total_ms']:,.0f} ms. Journal JSON : {perf.LOG_PATH}")
+		st.dataframe(perf.percentiles(perf_history), use_container_width=True)
+		if perf.PROFILING:
+			# Le rappel s'exécute avant le script : l'exécution déclenchée par le clic est profilée
+			st.button("🔬 Profiler une exécution", on_click=lambda: st.session_state.update(perf_profile_next=True))
+			if 'perf_profile' in st.session_state:
+				st.markdown(f"Profil cProfile : `{st.session_state['perf_profile']}`")
+				st.code(perf.profile_report(st.session_state['perf_profile']))
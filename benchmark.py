@@ -0,0 +1,212 @@
+"""benchmark.py
+Headless benchmark of the dashboard pipeline, stage by stage.
+
+Every stage the app runs is timed on data.csv and on synthetic datasets
+scaled to 10x and 100x its size: CSV parse, validation, scoring, INSEE enrichment,
+compaction, snapshot hashing, incremental rescoring and diff (1% of the rows
+changed), index/cube build, filtering with representative sidebar settings,
+sorting and top-k paging, aggregations, Pareto layers, and chart/map/table data
+preparation. The scaled datasets come from generate_data.py (seeded, so a
+given `--seed` always benchmarks the same rows). Nothing imports Streamlit.
+
+Each stage runs `--repeat` times; the minimum and median wall times are
+written as JSON. Given a baseline file, medians are compared against it and
+any stage slower by more than `--tolerance` (and by more than the noise floor)
+is reported as a regression, with exit code 1:
+
+    python benchmark.py --scales 1 10 --save-baseline bench_baseline.json
+    python benchmark.py --scales 1 10 --baseline bench_baseline.json -o bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import charts
+import cube
+import dataset_cache
+import enrich
+import generate_data
+import pareto
+import pipeline
+import snapshots
+import validation
+from filters import FilterIndex, FilterState
+from map_layers import map_data
+from scoring import score_dataframe
+
+DEFAULT_SCALES = (1, 10, 100)
+NOISE_FLOOR_S = 0.005
+
+# Réglages représentatifs de la barre latérale
+FILTER_PRESETS = {
+    "defaut": FilterState(priorities=("A", "B"), min_population=3000, min_revenue=20000, min_score=50),
+    "tout": FilterState(),
+    "region": FilterState(region="BRETAGNE", min_score=40),
+    "recherche": FilterState(search="saint"),
+}
+
+
+def timed(fn, repeat):
+    """(result of the last call, list of wall times in seconds)."""
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def run_dataset(csv_path, repeat=3, insee=None):
+    """Stage timings for one source CSV: {stage: {"min_s", "median_s"}}."""
+    stages = {}
+
+    def stage(name, fn, n=repeat):
+        result, times = timed(fn, n)
+        stages[name] = {"min_s": min(times), "median_s": statistics.median(times)}
+        return result
+
+    raw = stage("parse_csv", lambda: dataset_cache.read_source(csv_path))
+    stage("validate", lambda: validation.validate(raw))
+    scored = stage("score", lambda: score_dataframe(raw))
+    if insee is not None:
+        scored = stage("enrich_insee", lambda: enrich.enrich(scored, insee))
+    df = stage("compact", lambda: dataset_cache.compact(scored))
+
+    # Rafraîchissement mensuel simulé : 1 % des communes modifiées depuis le snapshot précédent
+    keys, _ = stage("snapshot_hash", lambda: (snapshots.commune_keys(raw),
+                                              snapshots.row_hashes(raw, snapshots.input_columns(raw))))
+    changed = np.arange(len(df)) % 100 == 0
+    stage("rescore_incremental", lambda: snapshots.incremental_score(
+        raw, df, np.arange(len(df)), changed, changed, insee))
+    current = df.assign(**{snapshots.KEY_COLUMN: keys})
+    previous = current.assign(revenuAnnuel=current["revenuAnnuel"].to_numpy() + changed)
+    stage("snapshot_diff", lambda: snapshots.diff_snapshots(previous, current))
+
+    index = stage("build_filter_index", lambda: FilterIndex(df))
+    agg = stage("build_cube", lambda: cube.AggregateCube(df))
+    stage("build_search_index", lambda: index.search_index, n=1)
+
+    def cold(fn):
+        # Caches vidés à chaque répétition : mesure le calcul, pas le mémo
+        return lambda: (index.clear_cache(), fn())[1]
+
+    for name, state in FILTER_PRESETS.items():
+        stage(f"filter_{name}", cold(lambda: index.mask(state)))
+    state = FILTER_PRESETS["defaut"]
+    stage("sort_full_cold", cold(lambda: index.sorted_rows(state, "revenuAnnuel", False)))
+    stage("sort_full_warm", lambda: index.sorted_rows(state, "revenuAnnuel", False))
+    stage("page_topk", cold(lambda: index.page(state, "score", False, 0, 50)))
+    rows = index.rows(state)
+
+    filtered = df.iloc[rows]
+    stage("aggregate_scan", lambda: (pipeline.overview(filtered), pipeline.priority_counts(filtered),
+                                     pipeline.priority_revenue(filtered), pipeline.region_stats(filtered)))
+    summary = stage("aggregate_cube", lambda: agg.summary(state))
+    stage("aggregate_cube_tables", lambda: (cube.overview(summary), cube.priority_counts(summary),
+                                            cube.priority_revenue(summary), cube.region_stats(summary)))
+
+    stage("pareto_layers", lambda: pareto.pareto_layers(
+        pareto.frame_values(filtered, ("score", "revenuAnnuel", "clientsPotentiels")), 3))
+    stage("chart_top_revenue", lambda: charts.top_revenue_figure(pipeline.top_revenue(filtered, 20)))
+    stage("chart_regions", lambda: charts.region_figure(cube.region_stats(summary)))
+    stage("map_cells", lambda: map_data(filtered, 5))
+    stage("map_points", lambda: map_data(filtered, 10))
+    stage("table_page", lambda: df.iloc[index.page(state, "revenuAnnuel", False, 0, 50)])
+    return {"rows": len(df), "stages": stages}
+
+
+def run(scales=DEFAULT_SCALES, repeat=3, csv_path=pipeline.DATA_PATH, workdir=None, seed=0):
+    """Benchmark data.csv at each scale factor; returns the JSON-ready results."""
+    base_rows = len(dataset_cache.read_source(csv_path))
+    # Chargement initial des templates Plotly, hors mesure
+    charts.region_figure(pd.DataFrame({"Région": ["-"], "Revenu Total": [0]}))
+    insee = enrich.read_insee() if enrich.INSEE_PATH.exists() else None
+    results = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+        },
+        "datasets": {},
+    }
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for factor in scales:
+            if factor == 1:
+                path = Path(csv_path)
+            else:
+                path = Path(tmp) / f"data-x{factor}.csv"
+                generate_data.write(path, base_rows * factor, seed, reference=csv_path)
+            name = f"x{factor}"
+            print(f"[{name}] {path.name} ...", flush=True)
+            results["datasets"][name] = run_dataset(path, repeat, insee)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, noise_floor=NOISE_FLOOR_S):
+    """Stages whose median is slower than the baseline by more than `tolerance` (relative) and `noise_floor`."""
+    regressions = []
+    for name, dataset in results["datasets"].items():
+        reference = baseline.get("datasets", {}).get(name, {}).get("stages", {})
+        for stage, timing in dataset["stages"].items():
+            ref = reference.get(stage)
+            if ref is None:
+                continue
+            now, before = timing["median_s"], ref["median_s"]
+            if now > before * (1 + tolerance) and now - before > noise_floor:
+                regressions.append({"dataset": name, "stage": stage, "baseline_s": before, "median_s": now,
+                                    "ratio": now / before if before else float("inf")})
+    return regressions
+
+
+def _print_table(results):
+    for name, dataset in results["datasets"].items():
+        print(f"\n{name} ({dataset['rows']:,} rows)")
+        for stage, timing in dataset["stages"].items():
+            print(f"  {stage:<24} {timing['median_s'] * 1000:10.1f} ms  (min {timing['min_s'] * 1000:.1f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring/filter/aggregation pipeline headlessly.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.repeat, seed=args.seed)
+    _print_table(results)
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=1), encoding="utf-8")
+            print(f"\nSaved results to {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSION: {len(regressions)} stage(s) slower than {args.baseline}")
+            for r in regressions:
+                print(f"  {r['dataset']}/{r['stage']}: {r['baseline_s'] * 1000:.1f} -> {r['median_s'] * 1000:.1f} ms "
+                      f"(x{r['ratio']:.2f})")
+            return 1
+        print(f"\nOK: no stage slower than {args.baseline} by more than {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
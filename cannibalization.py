@@ -0,0 +1,171 @@
+"""cannibalization.py
+Client estimates discounted for overlap with already-served neighbours.
+
+`NeighbourGraph` links two communes when each lies within the other's
+catchment radius (zoneChalandise, see `spatial.zone_radius_km`). Each edge
+carries the share of a commune's catchment disc covered by its neighbour's
+disc (circle-circle lens area), in both directions. The graph is stored as
+CSR rows built from one batched `SpatialIndex.pairs_within` call.
+
+A served neighbour keeps `PART_CAPTEE` of the clients in the shared part of
+the catchment, so commune i keeps the fraction
+    prod over served neighbours j of (1 - PART_CAPTEE * share(i, j))
+of its clients. In log space this is a sparse matrix-vector product of the
+log factors with the served indicator (np.bincount over the edges).
+`ServedModel` keeps that vector up to date: marking or unmarking communes as
+served only adds or subtracts their own edges. The per-edge log factors are
+computed once per capture share and held read-only by the graph, which the
+dashboard shares across sessions; a model only owns its served indicator and
+its kept-share vector.
+"""
+import threading
+
+import numpy as np
+
+from scoring import compute_revenue
+from spatial import SpatialIndex, zone_radius_km
+
+# Part des clients de la zone commune conservée par le voisin déjà desservi
+PART_CAPTEE = 0.5
+
+
+def overlap_share(d, a, b):
+    """Share of the disc of radius `a` covered by a disc of radius `b` whose centre is `d` away."""
+    d, a, b = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (d, a, b)))
+    area = np.zeros(d.shape)
+    inside = d <= np.abs(a - b)
+    area[inside] = np.pi * np.minimum(a[inside], b[inside]) ** 2
+    lens = ~inside & (d < a + b)
+    dl, al, bl = d[lens], a[lens], b[lens]
+    area[lens] = (
+        al ** 2 * np.arccos(np.clip((dl ** 2 + al ** 2 - bl ** 2) / (2 * dl * al), -1, 1))
+        + bl ** 2 * np.arccos(np.clip((dl ** 2 + bl ** 2 - al ** 2) / (2 * dl * bl), -1, 1))
+        - 0.5 * np.sqrt(np.maximum((-dl + al + bl) * (dl + al - bl) * (dl - al + bl) * (dl + al + bl), 0))
+    )
+    share = np.zeros(d.shape)
+    np.divide(area, np.pi * a ** 2, out=share, where=a > 0)
+    return np.minimum(share, 1.0)
+
+
+def _edge_positions(starts, rows):
+    """Concatenated edge positions of CSR `rows`."""
+    lo, hi = starts[rows], starts[rows + 1]
+    counts = hi - lo
+    return np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+class NeighbourGraph:
+    """Mutual-catchment neighbours of every commune, as CSR rows with overlap shares."""
+
+    def __init__(self, lat, lon, radius_km, chunk_size=1024):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        radius = np.asarray(radius_km, dtype=np.float64)
+        self.n = len(lat)
+        parts = []
+        for start, q, p, d in SpatialIndex(lat, lon).iter_pairs(lat, lon, radius, chunk_size):
+            q = q + start
+            keep = (q != p) & (d <= radius[p])
+            parts.append((q[keep], p[keep], d[keep]))
+        if parts:
+            rows, cols, dist = (np.concatenate(a) for a in zip(*parts))
+        else:
+            rows, cols, dist = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        # Lignes groupées par commune (pairs_within renvoie les paires par requête)
+        self.starts = np.searchsorted(rows, np.arange(self.n + 1))
+        self.neighbours = cols.astype(np.int32)
+        # share_in : part de la zone de la ligne couverte par le voisin ; share_out : l'inverse
+        self.share_in = overlap_share(dist, radius[rows], radius[cols]).astype(np.float32)
+        self.share_out = overlap_share(dist, radius[cols], radius[rows]).astype(np.float32)
+        self._log_keep = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df, chunk_size=1024):
+        return cls(df["lat"].to_numpy(), df["lon"].to_numpy(), zone_radius_km(df), chunk_size)
+
+    @property
+    def n_edges(self):
+        return len(self.neighbours)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            cached = sum(a.nbytes for pair in self._log_keep.values() for a in pair)
+        return self.starts.nbytes + self.neighbours.nbytes + self.share_in.nbytes + self.share_out.nbytes + cached
+
+    def degree(self):
+        return np.diff(self.starts)
+
+    def rows(self):
+        """Row (commune) of every edge."""
+        return np.repeat(np.arange(self.n), self.degree())
+
+    def log_keep(self, capture=PART_CAPTEE):
+        """(incoming, outgoing) log of the kept client share per edge, cached read-only per `capture`."""
+        key = float(capture)
+        with self._lock:
+            pair = self._log_keep.get(key)
+        if pair is None:
+            pair = (np.log1p(-key * self.share_in.astype(np.float64)),
+                    np.log1p(-key * self.share_out.astype(np.float64)))
+            for a in pair:
+                a.flags.writeable = False
+            with self._lock:
+                pair = self._log_keep.setdefault(key, pair)
+        return pair
+
+    def matvec(self, weights, x):
+        """y = W @ x, W holding `weights` on the edges (row = commune, column = neighbour)."""
+        return np.bincount(self.rows(), weights=weights * np.asarray(x, dtype=np.float64)[self.neighbours],
+                           minlength=self.n)
+
+
+class ServedModel:
+    """Cannibalization-adjusted clients for a set of served communes, updated incrementally."""
+
+    def __init__(self, graph, clients, capture=PART_CAPTEE):
+        self.graph = graph
+        self.clients = np.asarray(clients)  # vue sur la table partagée, sans copie
+        self.capture = capture
+        self._log_in, self._log_out = graph.log_keep(capture)
+        self.served = np.zeros(graph.n, dtype=bool)
+        self._log_kept = np.zeros(graph.n)
+
+    def _apply(self, rows, sign):
+        edges = _edge_positions(self.graph.starts, rows)
+        # Les voisins des communes ajoutées/retirées perdent/retrouvent leur part de zone commune
+        np.add.at(self._log_kept, self.graph.neighbours[edges], sign * self._log_out[edges])
+
+    def mark_served(self, rows):
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        rows = rows[~self.served[rows]]
+        self.served[rows] = True
+        self._apply(rows, 1.0)
+
+    def unmark_served(self, rows):
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        rows = rows[self.served[rows]]
+        self.served[rows] = False
+        self._apply(rows, -1.0)
+
+    def set_served(self, rows):
+        """Make exactly `rows` served, touching only the communes that changed."""
+        target = np.zeros(self.graph.n, dtype=bool)
+        target[np.asarray(rows, dtype=np.int64)] = True
+        self.unmark_served(np.flatnonzero(self.served & ~target))
+        self.mark_served(np.flatnonzero(target & ~self.served))
+
+    def recompute(self):
+        """Full sparse product from the served indicator (drops accumulated rounding)."""
+        self._log_kept = self.graph.matvec(self._log_in, self.served)
+        return self._log_kept
+
+    def kept_share(self):
+        return np.exp(self._log_kept)
+
+    def adjusted_clients(self):
+        return self.clients * self.kept_share()
+
+    def adjusted_revenue(self):
+        return compute_revenue(self.adjusted_clients())
@@ -0,0 +1,90 @@
+"""charts.py
+Plotly figures of the dashboard's analysis section and their shared cache.
+
+Figures are built from already aggregated data (top-20 table, cube summary)
+and memoized in a `FigureCache`: an LRU keyed by chart name and the
+canonical filter-state hash (`FilterState.key()`), bounded by the serialized
+size of the figures it holds. One cache is shared by every session, so a
+filter preset that any user already displayed is served without rebuilding.
+"""
+import threading
+from collections import OrderedDict
+
+import plotly.express as px
+
+PRIORITY_COLORS = {"A": "#10b981", "B": "#3b82f6", "C": "#f59e0b", "D": "#ef4444"}
+
+
+def top_revenue_figure(top_revenue):
+    fig = px.bar(
+        top_revenue,
+        x="nom",
+        y="revenuAnnuel",
+        color="priorite",
+        color_discrete_map=PRIORITY_COLORS,
+        title="Revenu Annuel Potentiel par Ville",
+        labels={"revenuAnnuel": "Revenu Annuel (€)", "nom": "Ville"},
+        height=500,
+    )
+    fig.update_layout(showlegend=True, xaxis_tickangle=-45)
+    return fig
+
+
+def priority_figure(priority_counts):
+    return px.pie(
+        priority_counts,
+        values="Nombre",
+        names="Priorité",
+        color="Priorité",
+        color_discrete_map=PRIORITY_COLORS,
+        title="Répartition des Villes par Priorité",
+        height=500,
+    )
+
+
+def region_figure(region_stats, top=15):
+    fig = px.bar(
+        region_stats.head(top),
+        x="Région",
+        y="Revenu Total",
+        title=f"Top {top} Régions par Revenu Potentiel",
+        labels={"Revenu Total": "Revenu Annuel Total (€)"},
+        height=500,
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+class FigureCache:
+    """Thread-safe LRU of Plotly figures, evicting least recently used ones beyond `max_bytes`."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, build):
+        """Cached figure for `key`, built with `build()` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        fig = build()
+        size = len(fig.to_json())
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (fig, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+        return fig
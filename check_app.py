@@ -1,51 +1,228 @@
 """check_app.py
-Simple validation script used by CI to import the app and exercise data loading.
+Simple validation script used by CI to exercise data loading through the
+headless pipeline (the Streamlit app is not executed).
+Runs the data-quality rules of validation.py over data.csv (streamed in
+chunks, JSON report written with --report), then checks that the vectorized
+scoring engine matches the reference row functions and that the Pareto layers
+match a pairwise dominance check. Finally fetch_insee.fetch() is run against
+a local stand-in of the geo API (http.server on 127.0.0.1): fresh fetch,
+resume after a failure, 404 departments recorded absent, 304 on ETags.
 Exits with non-zero code on failure so the workflow fails early.
 """
+import contextlib
+import io
+import json
 import sys
-from importlib import util
+import tempfile
+import threading
 from pathlib import Path
 
+import pipeline
 
-def main():
+
+def _edge_cases(df):
+    """Rows sitting exactly on every bonus/penalty/priority threshold."""
+    import pandas as pd
+
+    base = df.iloc[[0]]
+    cases = [
+        {"pct_maison": v} for v in (0, 59, 60, 61, 70, 71, 80, 81, 90, 100)
+    ] + [
+        {"pct_appartement": v} for v in (49, 50, 51, 60, 61, 70, 71, 100)
+    ] + [
+        {"population": v} for v in (0, 1, 50000, 50001, 100000, 100001)
+    ] + [
+        {"zoneChalandise": v} for v in (0, 299, 300, 301)
+    ] + [
+        {"revenuMedian": 27000, "tauxProprietaires": 70, "plus60ans": 35.0, "pct_30_44": 25.0},
+        {"revenuMedian": 40000, "tauxProprietaires": 100, "plus60ans": 60.0, "pct_30_44": 40.0},
+        {"population": 4000, "plus60ans": 30.25},
+    ]
+    rows = []
+    for case in cases:
+        row = base.copy()
+        for col, value in case.items():
+            row[col] = value
+        rows.append(row)
+    return pd.concat(rows, ignore_index=True)
+
+
+def check_scoring(csv_path):
+    """Return the list of scored columns where the two engines disagree."""
+    import pandas as pd
+    from scoring import SCORED_COLUMNS, score_dataframe, score_dataframe_rowwise
+
+    df = pd.read_csv(csv_path, sep=";")
+    df = pd.concat([df, _edge_cases(df)], ignore_index=True)
+    fast = score_dataframe(df)
+    slow = score_dataframe_rowwise(df)
+    mismatched = []
+    for col in SCORED_COLUMNS:
+        if not (fast[col].astype(object).to_numpy() == slow[col].to_numpy()).all():
+            mismatched.append(col)
+    print(f"INFO: compared scoring engines on {len(df)} rows")
+    return mismatched
+
+
+def check_pareto(df, n=2000, max_layers=3):
+    """Metric sets where pareto.pareto_layers() differs from the pairwise reference."""
+    import pareto
+
+    sample = df.iloc[:n]
+    mismatched = []
+    for columns in (("score", "revenuAnnuel"), ("score", "revenuAnnuel", "clientsPotentiels"),
+                    ("score", "revenuAnnuel", "clientsPotentiels", "tauxProprietaires", "pct_maison")):
+        values = pareto.frame_values(sample, columns)
+        if not (pareto.pareto_layers(values, max_layers) == pareto.dominance_naive(values, max_layers)).all():
+            mismatched.append(columns)
+    print(f"INFO: compared Pareto layers on {len(sample)} rows")
+    return mismatched
+
+
+def _geo_stub(communes, fail):
+    """Local stand-in of geo.api.gouv.fr serving `communes` (code -> list); codes in `fail` answer 400."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if parts == ["departements"]:
+                return self._send(200, json.dumps([{"code": c} for c in communes]).encode(),
+                                  [("Content-Type", "application/json")])
+            code = parts[1] if len(parts) == 3 and parts[2] == "communes" else None
+            etag = f'"{code}-v1"'
+            if code in fail:
+                status = 400
+            elif code not in communes or communes[code] is None:
+                status = 404
+            elif self.headers.get("If-None-Match") == etag:
+                status = 304
+            else:
+                status = 200
+            requests_seen.append((code, status))
+            if status == 200:
+                body = json.dumps(communes[code]).encode("utf-8")
+                return self._send(200, body, [("Content-Type", "application/json; charset=utf-8"), ("ETag", etag)])
+            return self._send(status)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, requests_seen
+
+
+def check_fetch():
+    """Problems found running fetch_insee.fetch() against a local stand-in server."""
+    import pandas as pd
+    import fetch_insee
+
+    def commune(code, nom, pop):
+        return {"nom": nom, "code": code, "codeDepartement": code[:2], "codeRegion": "84",
+                "population": pop, "centre": {"type": "Point", "coordinates": [5.2, 46.2]}}
+
+    communes = {
+        "01": [commune("01001", "L'Abergement-Clémenciat", 859), commune("01002", "L'Abergement-de-Varey", 267)],
+        "02": [commune("02001", "Abbécourt", 523)],
+        "03": None,  # 404
+    }
+    fail = {"02"}
+    server, seen = _geo_stub(communes, fail)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    problems = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            out, state = Path(tmp) / "insee.csv", Path(tmp) / "state"
+
+            def run():
+                seen.clear()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    failures = fetch_insee.fetch(out, base_url, workers=2, state_dir=state)
+                return failures, {code: status for code, status in seen}
+
+            failures, statuses = run()
+            manifest = json.loads((state / "manifest.json").read_text(encoding="utf-8"))
+            absent = {c for c, e in manifest["departements"].items() if e.get("absent")}
+            if failures != 1 or manifest["pending"] != ["02"] or out.exists():
+                problems.append("failed department not left pending")
+            if absent != {"03", *fetch_insee.EXTRA_DEPARTEMENTS}:
+                problems.append(f"404 departments not recorded absent: {sorted(absent)}")
+
+            fail.clear()
+            failures, statuses = run()
+            if failures or statuses != {"02": 200}:
+                problems.append(f"resume requested {statuses} instead of the pending department only")
+            elif sorted(pd.read_csv(out, dtype={"code": str})["code"]) != ["01001", "01002", "02001"]:
+                problems.append("combined output does not hold every commune")
+
+            failures, statuses = run()
+            if failures or statuses != {"01": 304, "02": 304}:
+                problems.append(f"refresh answered {statuses} instead of 304 for every present department")
+            elif len(pd.read_csv(out)) != 3:
+                problems.append("output changed on an unchanged refresh")
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("INFO: ran fetch_insee against a local stand-in server")
+    return problems
+
+
+def check_data(csv_path, report_path=None):
+    """Data-quality report of `csv_path` (validation.py rules), optionally written as JSON."""
+    from validation import summary, validate_file
+
+    report = validate_file(csv_path)
+    print(summary(report))
+    if report_path:
+        Path(report_path).write_text(json.dumps(report, indent=1, ensure_ascii=False), encoding="utf-8")
+    return report
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    report_path = argv[argv.index("--report") + 1] if "--report" in argv else None
     try:
-        p = Path(__file__).parent / "app.py"
-        if not p.exists():
-            print("ERROR: app.py not found next to check_app.py")
+        report = check_data(Path(__file__).parent / "data.csv", report_path)
+        if not report["ok"]:
+            print("ERROR: data.csv breaks data-quality rules (see above)")
             return 4
-        spec = util.spec_from_file_location("app_module", str(p))
-        mod = util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        if not hasattr(mod, "load_data"):
-            print("ERROR: app.py does not define load_data()")
-            return 2
-        df = mod.load_data()
+        print("OK: data.csv passes the data-quality rules")
+
+        mismatched = check_scoring(Path(__file__).parent / "data.csv")
+        if mismatched:
+            print("ERROR: vectorized scoring differs from row functions on:", mismatched)
+            return 5
+        print("OK: vectorized scoring matches the row functions")
+
+        # Headless: the pipeline loads and scores the data without importing Streamlit
+        df = pipeline.load_data()
         print(f"OK: load_data returned {len(df)} rows")
-        # quick sanity checks
-        # Accept common column name variants so the app can be localized.
-        column_aliases = {
-            "City": ["City", "Ville", "nom", "city"],
-            "Population": ["Population", "population", "pop", "population_total"],
-        }
-
-        missing = []
-        used = {}
-        for logical, aliases in column_aliases.items():
-            found = next((a for a in aliases if a in df.columns), None)
-            if not found:
-                missing.append(logical)
-            else:
-                used[logical] = found
 
-        if missing:
-            print("ERROR: Missing required logical columns:", missing)
-            print("Available columns:", list(df.columns))
-            return 3
+        mismatched = check_pareto(df)
+        if mismatched:
+            print("ERROR: Pareto layers differ from the pairwise check on:", mismatched)
+            return 6
+        print("OK: Pareto layers match the pairwise check")
 
-        print("INFO: using columns:", used)
+        problems = check_fetch()
+        if problems:
+            print("ERROR: fetch_insee against the stand-in server:", problems)
+            return 7
+        print("OK: fetch_insee handles 200, 304, 404 and resume")
         return 0
     except Exception as e:
-        print("ERROR while validating app:", e)
+        print("ERROR while validating data pipeline:", e)
         return 1
 
 
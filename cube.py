@@ -0,0 +1,175 @@
+"""cube.py
+Pre-aggregated counts and sums behind the dashboard KPIs and charts.
+
+Communes are bucketed by region × département × priority × score bucket ×
+population bucket × revenue bucket. Each occupied cell keeps its commune
+count, revenue and client totals and the min/max of the three thresholded
+columns. For a filter state, a cell whose minima all clear the thresholds is
+taken whole, a cell whose maximum misses one is dropped, and only the rows of
+the remaining edge cells are scanned. Bucket edges follow the sidebar steps
+(score slider by 5, revenue by 5 000 €, population by 1 000), so the default
+filters hit at most one edge bucket per column.
+
+The result of a query is a small (region, priority) summary from which the
+overview metrics, the priority tab and the region tab are derived; they
+match pipeline.overview/priority_counts/priority_revenue/region_stats.
+"""
+import numpy as np
+import pandas as pd
+
+from scoring import PRIORITIES
+
+SCORE_EDGES = np.arange(0, 101, 5)
+POPULATION_EDGES = np.concatenate([np.arange(0, 10001, 1000), [15000, 20000, 30000, 50000, 100000, 200000]])
+REVENUE_EDGES = np.concatenate([np.arange(0, 100001, 5000), [150000, 200000, 500000]])
+
+# (colonne, champ de FilterState, bornes des tranches)
+THRESHOLDS = (
+    ("population", "min_population", POPULATION_EDGES),
+    ("revenuAnnuel", "min_revenue", REVENUE_EDGES),
+    ("score", "min_score", SCORE_EDGES),
+)
+MEASURES = ("revenuAnnuel", "clientsPotentiels")
+SUMMARY_COLUMNS = ["region", "priorite", "villes", *MEASURES]
+
+
+def _bucket(values, edges):
+    """Bucket of each value: 0 below edges[1], k for edges[k] <= v < edges[k + 1]."""
+    return np.searchsorted(edges[1:], values, side="right")
+
+
+class AggregateCube:
+    def __init__(self, df):
+        self.n = len(df)
+        region, self.regions = pd.factorize(df["region"].astype(str), sort=True)
+        departement, departements = pd.factorize(df["departement"].astype(str), sort=True)
+        priority = pd.Categorical(df["priorite"].astype(str), categories=PRIORITIES).codes.astype(np.int64)
+        self._group = region * len(PRIORITIES) + priority
+        self._values = {col: df[col].to_numpy(dtype=np.float64) for col, _, _ in THRESHOLDS}
+        self._measures = {col: df[col].to_numpy(dtype=np.float64) for col in MEASURES}
+
+        dims = [region, departement, priority] + [_bucket(self._values[col], edges) for col, _, edges in THRESHOLDS]
+        shape = [len(self.regions), len(departements), len(PRIORITIES)] + [len(edges) for _, _, edges in THRESHOLDS]
+        keys = np.ravel_multi_index(dims, shape) if self.n else np.empty(0, dtype=np.int64)
+        _, cell = np.unique(keys, return_inverse=True)
+        self.n_cells = int(cell.max()) + 1 if self.n else 0
+
+        # Lignes regroupées par cellule (CSR) pour balayer les cellules de bord
+        self._rows = np.argsort(cell, kind="stable")
+        counts = np.bincount(cell, minlength=self.n_cells)
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        starts = self._offsets[:-1]
+        first = self._rows[starts]
+
+        self._cell_count = counts
+        self._cell_group = self._group[first]
+        self._cell_region = region[first]
+        self._cell_priority = priority[first]
+        self._cell_sums = {col: np.bincount(cell, weights=v, minlength=self.n_cells) for col, v in self._measures.items()}
+        self._cell_min, self._cell_max = {}, {}
+        for col, v in self._values.items():
+            ordered = v[self._rows]
+            self._cell_min[col] = np.minimum.reduceat(ordered, starts) if self.n else np.empty(0)
+            self._cell_max[col] = np.maximum.reduceat(ordered, starts) if self.n else np.empty(0)
+        self.last_scanned = 0
+
+    # --- Requêtes ------------------------------------------------------------
+
+    def _cells_for(self, state):
+        """(whole cells, edge cells) for the region/priority/threshold part of `state`."""
+        selected = np.ones(self.n_cells, dtype=bool)
+        if state.region is not None:
+            code = self.regions.get_indexer([str(state.region)])[0]
+            selected &= self._cell_region == code
+        if state.priorities:
+            codes = [PRIORITIES.index(p) for p in state.priorities if p in PRIORITIES]
+            selected &= np.isin(self._cell_priority, codes)
+        edge = np.zeros(self.n_cells, dtype=bool)
+        for col, field, _ in THRESHOLDS:
+            minimum = getattr(state, field)
+            selected &= self._cell_max[col] >= minimum
+            edge |= self._cell_min[col] < minimum
+        return selected & ~edge, selected & edge
+
+    def _edge_rows(self, cells, state):
+        starts, counts = self._offsets[:-1][cells], self._cell_count[cells]
+        pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        rows = self._rows[pos]
+        keep = np.ones(len(rows), dtype=bool)
+        for col, field, _ in THRESHOLDS:
+            keep &= self._values[col][rows] >= getattr(state, field)
+        return rows[keep], len(rows)
+
+    def summary(self, state):
+        """(region, priority) totals of the communes matching `state` (search must be empty)."""
+        if state.search:
+            raise ValueError("text search is row-level: use summarize_rows() on the matching rows")
+        whole, edge = self._cells_for(state)
+        size = len(self.regions) * len(PRIORITIES)
+        groups = self._cell_group[whole]
+        counts = np.bincount(groups, weights=self._cell_count[whole], minlength=size)
+        sums = {col: np.bincount(groups, weights=s[whole], minlength=size) for col, s in self._cell_sums.items()}
+
+        rows, self.last_scanned = self._edge_rows(np.flatnonzero(edge), state)
+        counts += np.bincount(self._group[rows], minlength=size)
+        for col, v in self._measures.items():
+            sums[col] += np.bincount(self._group[rows], weights=v[rows], minlength=size)
+        return self._frame(counts, sums)
+
+    def summarize_rows(self, rows):
+        """Same summary for an explicit selection of row positions (e.g. after a text search)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        size = len(self.regions) * len(PRIORITIES)
+        counts = np.bincount(self._group[rows], minlength=size)
+        sums = {col: np.bincount(self._group[rows], weights=v[rows], minlength=size) for col, v in self._measures.items()}
+        self.last_scanned = len(rows)
+        return self._frame(counts, sums)
+
+    def _frame(self, counts, sums):
+        present = np.flatnonzero(counts)
+        region, priority = np.divmod(present, len(PRIORITIES))
+        out = pd.DataFrame({
+            "region": np.asarray(self.regions)[region],
+            "priorite": pd.Categorical.from_codes(priority, categories=PRIORITIES, ordered=True),
+            "villes": counts[present].astype(np.int64),
+        })
+        for col in MEASURES:
+            out[col] = sums[col][present].astype(np.int64)
+        return out
+
+
+# --- Agrégations du tableau de bord (mêmes sorties que pipeline.py) ---------
+
+def overview(summary):
+    villes = int(summary["villes"].sum())
+    total = int(summary["revenuAnnuel"].sum())
+    return {
+        "villes": villes,
+        "revenuMoyen": total / villes if villes > 0 else 0.0,
+        "revenuTotal": total,
+        "villesPrioriteA": int(summary.loc[summary["priorite"] == "A", "villes"].sum()),
+        "clientsTotaux": int(summary["clientsPotentiels"].sum()),
+    }
+
+
+def priority_counts(summary):
+    counts = summary.groupby("priorite", observed=False)["villes"].sum()
+    counts = counts.sort_values(ascending=False).loc[lambda s: s > 0].reset_index()
+    counts.columns = ["Priorité", "Nombre"]
+    return counts
+
+
+def priority_revenue(summary):
+    revenue = summary.groupby("priorite", observed=True)["revenuAnnuel"].sum().reset_index()
+    revenue.columns = ["Priorité", "Revenu Total (€)"]
+    return revenue
+
+
+def region_stats(summary):
+    stats = summary.groupby("region").agg({
+        "revenuAnnuel": "sum",
+        "clientsPotentiels": "sum",
+        "villes": "sum",
+    }).reset_index()
+    stats.columns = ["Région", "Revenu Total", "Clients Totaux", "Nb Villes"]
+    return stats.sort_values("Revenu Total", ascending=False)
@@ -0,0 +1,188 @@
+"""dataset_cache.py
+Persistent cache of the fully scored communes table.
+
+The scored table is written as a Feather (Arrow IPC) file whose name embeds a
+hash of the source CSV bytes, of cities_insee.csv (used to attach INSEE codes,
+see enrich.py) and of the scoring parameters, so the app loads it directly on
+cold start and only rebuilds when one of them changes. A rebuild first
+checks the CSV against the data-quality rules (validation.py) and refuses to
+score a file with invalid rows.
+
+The artifact is stored with a compact schema (COMPACT_DTYPES): categoricals
+for repeated labels and the smallest integer/float types the values allow.
+priorite and saturation are already Categoricals (int8 codes) from scoring.
+Columns that feed the scoring formulas keep their exact float64 values so
+any rescoring of the loaded table (scenarios.py) matches the dashboard.
+
+The file is written uncompressed so the dashboard can memory-map it
+(load_shared): numeric and categorical columns are then read-only views of
+the mapped pages and strings stay in Arrow buffers, giving one copy of the
+table per process whatever the number of sessions.
+
+Build the artifact ahead of time with:
+
+    python dataset_cache.py [data.csv]
+"""
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from enrich import INSEE_PATH, enrich_file
+from pipeline import SOURCE_DTYPES
+from scoring import score_dataframe, scoring_params
+from validation import check as check_source
+
+CACHE_DIR = Path(__file__).parent / ".cache"
+CSV_PATH = Path(__file__).parent / "data.csv"
+
+ARTIFACT_FORMAT = "feather-uncompressed"
+
+COMPACT_DTYPES = {
+    "population": "int32",
+    "pct_15_29": "float32",
+    "pct_45_59": "float32",
+    "pct_maison": "uint8",
+    "pct_appartement": "uint8",
+    "revenuMedian": "int32",
+    "tauxProprietaires": "uint8",
+    "region": "category",
+    "zoneChalandise": "int16",
+    "departement": "category",
+    "lat": "float32",
+    "lon": "float32",
+    "score": "uint8",
+    "foyersPotentiels": "int32",
+    "clientsPotentiels": "int32",
+    "personnes60plus": "int32",
+    "revenuAnnuel": "int32",
+    "codeRegion": "category",
+    "populationInsee": "Int32",
+}
+
+
+def read_source(csv_path=CSV_PATH):
+    """Parse the semicolon-separated, BOM-prefixed communes CSV."""
+    return pd.read_csv(csv_path, sep=";", encoding="utf-8-sig", dtype=SOURCE_DTYPES)
+
+
+def _hash_file(h, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+
+def cache_key(csv_path=CSV_PATH):
+    """Hash of the source file and INSEE reference contents plus the scoring parameters."""
+    h = hashlib.sha256()
+    _hash_file(h, csv_path)
+    if INSEE_PATH.exists():
+        _hash_file(h, INSEE_PATH)
+    h.update(json.dumps(scoring_params(), sort_keys=True).encode("utf-8"))
+    h.update(json.dumps(COMPACT_DTYPES, sort_keys=True).encode("utf-8"))
+    h.update(json.dumps({col: dtype.__name__ for col, dtype in SOURCE_DTYPES.items()}, sort_keys=True).encode("utf-8"))
+    h.update(ARTIFACT_FORMAT.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _fits(series, dtype):
+    kind = dtype.lower()
+    if not kind.startswith(("int", "uint")) or series.dropna().empty:
+        return True
+    info = np.iinfo(kind)
+    return info.min <= series.min() and series.max() <= info.max
+
+
+def compact(df):
+    """`df` downcast to COMPACT_DTYPES, skipping columns whose values do not fit."""
+    return df.assign(**{
+        col: df[col].astype(dtype)
+        for col, dtype in COMPACT_DTYPES.items()
+        if col in df.columns and _fits(df[col], dtype)
+    })
+
+
+def memory_report(frames):
+    """Deep memory usage (bytes) of each named frame in `frames`, one row per frame."""
+    return pd.DataFrame(
+        [(name, len(frame), frame.shape[1], int(frame.memory_usage(deep=True).sum())) for name, frame in frames.items()],
+        columns=["table", "lignes", "colonnes", "octets"],
+    )
+
+
+def artifact_path(csv_path=CSV_PATH, cache_dir=CACHE_DIR, key=None):
+    key = key or cache_key(csv_path)
+    return Path(cache_dir) / f"{Path(csv_path).stem}-scored-{key}.feather"
+
+
+def build(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Validate, score and enrich the CSV, write the artifact and drop stale ones. Returns the DataFrame.
+
+    Raises validation.ValidationError when the CSV breaks a data-quality rule.
+    """
+    raw = read_source(csv_path)
+    check_source(raw, csv_path)
+    df = compact(enrich_file(score_dataframe(raw)))
+    write_artifact(df, csv_path, cache_dir)
+    return df
+
+
+def write_artifact(df, csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Store the scored table `df` of `csv_path` as the current artifact and drop stale ones."""
+    target = artifact_path(csv_path, cache_dir)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp")
+        df.to_feather(tmp, compression="uncompressed")
+        os.replace(tmp, target)
+        for stale in target.parent.glob(f"{Path(csv_path).stem}-scored-*.feather"):
+            if stale != target:
+                stale.unlink()
+    except (ImportError, OSError) as e:
+        # Read-only filesystem or pyarrow missing: serve the freshly scored frame anyway.
+        print(f"WARNING: could not write scored cache ({e})")
+
+
+def load_scored(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Load the scored table from cache, rebuilding it if the inputs changed."""
+    target = artifact_path(csv_path, cache_dir)
+    if target.exists():
+        try:
+            return pd.read_feather(target)
+        except Exception as e:
+            print(f"WARNING: unreadable scored cache {target.name} ({e}), rebuilding")
+    return build(csv_path, cache_dir)
+
+
+def load_shared(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Read-only scored table backed by the memory-mapped artifact.
+
+    Meant to be loaded once per process and shared: no column is copied into
+    private memory, and writing to the frame raises ValueError. Falls back
+    to an ordinary in-memory frame when the artifact cannot be written.
+    """
+    target = artifact_path(csv_path, cache_dir)
+    if not target.exists():
+        df = build(csv_path, cache_dir)
+        if not target.exists():
+            return df
+    try:
+        import pyarrow as pa
+        from pyarrow import feather
+
+        table = feather.read_table(target, memory_map=True)
+        return table.to_pandas(split_blocks=True, types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+    except Exception as e:
+        print(f"WARNING: cannot memory-map scored cache {target.name} ({e}), loading a private copy")
+        return load_scored(csv_path, cache_dir)
+
+
+if __name__ == "__main__":
+    src = Path(sys.argv[1]) if len(sys.argv) > 1 else CSV_PATH
+    out = build(src)
+    print(f"Saved {len(out)} scored communes to {artifact_path(src)}")
+    print(memory_report({"source": read_source(src), "scored": out}).to_string(index=False))
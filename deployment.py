@@ -0,0 +1,110 @@
+"""deployment.py
+Budget-constrained selection and ordering of franchise openings.
+
+Candidates (cities or territories) are ranked by revenue per euro invested.
+Each phase budget is then filled greedily: take every candidate that still
+fits, in ratio order. The greedy fill runs in vectorized rounds (prefix that
+fits, then drop what can no longer fit), which gives the same result as the
+sequential loop. As in the classic knapsack 1/2-approximation, the single
+best candidate that fits replaces the greedy pick when it earns more. The
+fractional (LP) relaxation gives an upper bound on the optimum per phase.
+"""
+import numpy as np
+import pandas as pd
+
+COUT_FRANCHISE = 25000
+PHASES = ("Phase 1", "Phase 2", "Phase 3")
+
+
+def greedy_fill(costs, budget):
+    """Boolean mask of the items taken by a sequential greedy fill, and the amount spent.
+
+    `costs` must already be in priority order.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    taken = np.zeros(len(costs), dtype=bool)
+    remaining = float(budget)
+    idx = np.flatnonzero(costs <= remaining)
+    while idx.size:
+        cum = np.cumsum(costs[idx])
+        k = int(np.searchsorted(cum, remaining, side="right"))
+        taken[idx[:k]] = True
+        if k:
+            remaining -= cum[k - 1]
+        rest = idx[k + 1:]
+        idx = rest[costs[rest] <= remaining]
+    return taken, float(budget) - remaining
+
+
+def lp_bound(values, costs, budget):
+    """Fractional-knapsack upper bound for items already sorted by value/cost."""
+    values = np.asarray(values, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+    cum = np.cumsum(costs)
+    k = int(np.searchsorted(cum, budget, side="right"))
+    bound = values[:k].sum()
+    if k < len(costs):
+        spent = cum[k - 1] if k else 0.0
+        bound += values[k] * (budget - spent) / costs[k]
+    return bound
+
+
+def optimize_deployment(df, budget, phase_budgets=None, cost=COUT_FRANCHISE, value="revenuAnnuel"):
+    """Pick and order candidates from `df` to maximise `value` under the budgets.
+
+    `cost` is a scalar, an array aligned with `df` or a column name. Returns
+    (plan, summary): one row per selected candidate in opening order with its
+    phase, cost and revenue per euro; one row per phase with budget, spend,
+    revenue, LP upper bound and the marginal revenue per euro of its last pick.
+    """
+    n = len(df)
+    values = df[value].to_numpy(dtype=np.float64)
+    costs = df[cost].to_numpy(dtype=np.float64) if isinstance(cost, str) else np.broadcast_to(
+        np.asarray(cost, dtype=np.float64), (n,)
+    ).copy()
+    costs = np.maximum(costs, 1.0)
+    ratio = values / costs
+    if phase_budgets is None:
+        phase_budgets = [budget]
+
+    order = np.lexsort((np.arange(n), -values, -ratio))
+    available = np.ones(n, dtype=bool)
+    total_left = float(budget)
+    picks, summary = [], []
+
+    for phase, phase_budget in enumerate(phase_budgets):
+        name = PHASES[phase] if phase < len(PHASES) else f"Phase {phase + 1}"
+        cap = min(float(phase_budget), total_left)
+        pool = order[available[order]]
+        taken, spent = greedy_fill(costs[pool], cap)
+        chosen = pool[taken]
+
+        fits = pool[costs[pool] <= cap]
+        if len(fits):
+            best = fits[np.argmax(values[fits])]
+            if values[best] > values[chosen].sum():
+                chosen, spent = np.array([best]), costs[best]
+
+        available[chosen] = False
+        total_left -= spent
+        picks.append(pd.DataFrame({"position": chosen, "phase": name}))
+        summary.append({
+            "phase": name,
+            "budget": cap,
+            "investissement": spent,
+            "nbOuvertures": len(chosen),
+            value: values[chosen].sum(),
+            "borneSuperieure": lp_bound(values[pool], costs[pool], cap),
+            "revenuMarginalParEuro": ratio[chosen[-1]] if len(chosen) else 0.0,
+        })
+
+    picks = pd.concat(picks, ignore_index=True) if picks else pd.DataFrame(columns=["position", "phase"])
+    pos = picks["position"].to_numpy(dtype=np.int64)
+    plan = df.iloc[pos].reset_index(drop=True)
+    plan.insert(0, "phase", picks["phase"].to_numpy())
+    plan.insert(0, "rang", np.arange(1, len(plan) + 1))
+    plan["cout"] = costs[pos]
+    plan["revenuParEuro"] = ratio[pos]
+    plan["coutCumule"] = np.cumsum(costs[pos])
+    plan["revenuCumule"] = np.cumsum(values[pos])
+    return plan, pd.DataFrame(summary)
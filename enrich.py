@@ -0,0 +1,180 @@
+"""enrich.py
+Attach official INSEE identifiers (cities_insee.csv) to the data.csv communes.
+
+data.csv only identifies a commune by its upper-case name and department.
+Both tables get a normalized commune key (accents and ligatures folded,
+punctuation to spaces, "SAINT"/"SAINTE" -> "st"/"ste", leading article and
+arrondissement suffix dropped), and are joined in one hash merge on
+(department, key). When a key is duplicated inside a department, the nearest
+INSEE commune wins. Only the rows left over go through a fuzzy fallback:
+same department and initial, close name (difflib ratio) and centres a few km
+apart, so renamed spellings match but merged or deleted communes do not.
+Leftover rows are prefiltered together per (department, initial) group with
+array operations, and each row compares its name with at most the
+CANDIDATS_MAX nearest candidates, so the fallback stays fast even when most
+rows are unmatched (synthetic or foreign names).
+
+    python enrich.py [data.csv] [cities_insee.csv]
+"""
+import difflib
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from spatial import haversine_km
+
+INSEE_PATH = Path(__file__).parent / "cities_insee.csv"
+INSEE_COLUMNS = ["codeInsee", "codeRegion", "populationInsee", "correspondanceInsee"]
+MATCH_LABELS = ["exacte", "approchee", "aucune"]
+
+SEUIL_SIMILARITE = 0.9
+DISTANCE_MAX_KM = 5.0
+ECART_LONGUEUR_MAX = 3
+# Candidats approchés comparés par commune (les plus proches) et lignes préfiltrées ensemble
+CANDIDATS_MAX = 8
+FUZZY_BLOCK = 2048
+
+
+def commune_key(names):
+    """Normalized join key for a Series of commune names."""
+    s = pd.Series(names, dtype=object).astype(str).str.lower()
+    s = s.str.replace("œ", "oe", regex=False).str.replace("æ", "ae", regex=False)
+    s = s.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    s = s.str.replace(r"\(.*?\)", " ", regex=True)
+    s = s.str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+    s = s.str.replace(r"\s*\b\d+\s*(?:e|er|eme)\s+arrondissement$", "", regex=True)
+    s = s.str.replace(r"\bsainte\b", "ste", regex=True).str.replace(r"\bsaint\b", "st", regex=True)
+    return s.str.replace(r"^(?:le|la|les|l)\s+", "", regex=True)
+
+
+def departement_key(codes):
+    """Department join key: zero-padded, with every overseas department as '97' like data.csv."""
+    s = pd.Series(codes, dtype=object).astype(str).str.strip().str.upper().str.zfill(2)
+    return s.where(~s.str.startswith("97"), "97")
+
+
+def read_insee(path=INSEE_PATH):
+    return pd.read_csv(path, dtype={"code": str, "codeDepartement": str, "codeRegion": str})
+
+
+def _exact(left, right):
+    """Position in `right` of the exact-key match of each `left` row (-1 if none)."""
+    merged = left[["dk", "k", "lat", "lon"]].reset_index(names="row").merge(
+        right[["dk", "k", "lat", "lon"]].reset_index(names="match"),
+        on=["dk", "k"], suffixes=("", "_insee"),
+    )
+    merged["distance"] = haversine_km(merged["lat"], merged["lon"], merged["lat_insee"], merged["lon_insee"])
+    merged = merged.sort_values(["row", "distance"], kind="stable").drop_duplicates("row")
+    match = np.full(len(left), -1, dtype=np.int64)
+    match[merged["row"].to_numpy()] = merged["match"].to_numpy()
+    return match
+
+
+def _fuzzy(left, right, rows):
+    """Best fuzzy match for each of `rows` (-1 when no candidate is close enough)."""
+    keys = right["k"].to_numpy()
+    lat, lon = right["lat"].to_numpy(dtype=np.float64), right["lon"].to_numpy(dtype=np.float64)
+    lengths = right["k"].str.len().to_numpy()
+    buckets = right.groupby([right["dk"], right["k"].str[:1]], sort=False).indices
+
+    query = left.iloc[rows]
+    qkeys = query["k"].to_numpy()
+    qlat, qlon = query["lat"].to_numpy(dtype=np.float64), query["lon"].to_numpy(dtype=np.float64)
+    qlengths = query["k"].str.len().to_numpy()
+    groups = query.groupby([query["dk"].to_numpy(), query["k"].str[:1].to_numpy()], sort=False).indices
+
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    out = np.full(len(rows), -1, dtype=np.int64)
+    for bucket, members in groups.items():
+        cands = buckets.get(bucket)
+        if cands is None:
+            continue
+        # Préfiltre vectorisé par groupe (département, initiale) : longueur proche et centres voisins
+        for start in range(0, len(members), FUZZY_BLOCK):
+            block = members[start:start + FUZZY_BLOCK]
+            distance = haversine_km(qlat[block, None], qlon[block, None], lat[None, cands], lon[None, cands])
+            near = (np.abs(lengths[None, cands] - qlengths[block, None]) <= ECART_LONGUEUR_MAX) & (distance <= DISTANCE_MAX_KM)
+            hit_rows, hit_cols = np.nonzero(near)
+            bounds = np.flatnonzero(np.diff(hit_rows)) + 1
+            for found, i in zip(np.split(hit_cols, bounds), hit_rows[np.r_[0, bounds]] if len(hit_rows) else ()):
+                n = block[i]
+                if len(found) > CANDIDATS_MAX:
+                    # Seulement les plus proches, dans l'ordre du référentiel
+                    found = np.sort(found[np.argpartition(distance[i, found], CANDIDATS_MAX - 1)[:CANDIDATS_MAX]])
+                matcher.set_seq2(qkeys[n])
+                best = SEUIL_SIMILARITE
+                for j in cands[found]:
+                    matcher.set_seq1(keys[j])
+                    if matcher.real_quick_ratio() >= best and matcher.quick_ratio() >= best:
+                        ratio = matcher.ratio()
+                        if ratio >= best:
+                            best, out[n] = ratio, j
+    return out
+
+
+def match_insee(df, insee):
+    """(positions in `insee`, match type codes) for each row of `df`; -1 / 2 when unmatched."""
+    left = pd.DataFrame({
+        "k": commune_key(df["nom"]).to_numpy(),
+        "dk": departement_key(df["departement"]).to_numpy(),
+        "lat": df["lat"].to_numpy(dtype=np.float64),
+        "lon": df["lon"].to_numpy(dtype=np.float64),
+    })
+    right = pd.DataFrame({
+        "k": commune_key(insee["nom"]).to_numpy(),
+        "dk": departement_key(insee["codeDepartement"]).to_numpy(),
+        "lat": insee["lat"].to_numpy(dtype=np.float64),
+        "lon": insee["lon"].to_numpy(dtype=np.float64),
+    })
+    match = _exact(left, right)
+    kind = np.where(match >= 0, 0, 2).astype(np.int8)
+    rest = np.flatnonzero(match < 0)
+    if len(rest):
+        fuzzy = _fuzzy(left, right, rest)
+        match[rest] = fuzzy
+        kind[rest[fuzzy >= 0]] = 1
+    return match, kind
+
+
+def enrich(df, insee):
+    """`df` with codeInsee, codeRegion, populationInsee and correspondanceInsee columns."""
+    match, kind = match_insee(df, insee)
+    found = match >= 0
+    take = np.where(found, match, 0)
+
+    def pick(col, dtype=object):
+        values = insee[col].to_numpy()[take].astype(dtype)
+        return np.where(found, values, None) if dtype is object else values
+
+    population = insee["population"].to_numpy(dtype=np.float64)[take]
+    return df.assign(
+        codeInsee=pick("code"),
+        codeRegion=pick("codeRegion"),
+        populationInsee=pd.array(np.where(found, population, np.nan), dtype="Int64"),
+        correspondanceInsee=pd.Categorical.from_codes(kind, MATCH_LABELS),
+    )
+
+
+def enrich_file(df, insee_path=INSEE_PATH):
+    """Enrich `df` from `insee_path`, or return it unchanged when the file is missing."""
+    if not Path(insee_path).exists():
+        return df
+    return enrich(df, read_insee(insee_path))
+
+
+if __name__ == "__main__":
+    import time
+
+    from dataset_cache import CSV_PATH, read_source
+
+    src = Path(sys.argv[1]) if len(sys.argv) > 1 else CSV_PATH
+    insee_path = Path(sys.argv[2]) if len(sys.argv) > 2 else INSEE_PATH
+    df, insee = read_source(src), read_insee(insee_path)
+    start = time.perf_counter()
+    out = enrich(df, insee)
+    elapsed = time.perf_counter() - start
+    counts = out["correspondanceInsee"].value_counts()
+    print(f"{len(out)} communes joined in {elapsed:.2f}s: "
+          + ", ".join(f"{counts[label]} {label}" for label in MATCH_LABELS))
@@ -0,0 +1,113 @@
+"""export.py
+Chunked export of a selection of scored communes to CSV, Parquet or XLSX.
+
+Rows are taken from the shared table by position, `chunk_size` at a time,
+and each chunk is converted and written before the next one is read: CSV
+text is appended, Parquet gets one row group per chunk and XLSX rows go
+through openpyxl's write-only workbook. Memory therefore stays bounded by
+one chunk whatever the size of the selection. Categorical columns are kept
+as such, so missing values stay missing in every format (Parquet stores
+them as dictionary columns with the same categories in every row group).
+The "full" scope adds the score breakdown (scoring.score_components) to
+every scored column.
+
+XLSX needs openpyxl; without it the format is simply not offered.
+"""
+import importlib.util
+import io
+
+import numpy as np
+import pandas as pd
+
+from scoring import score_components
+
+CHUNK_SIZE = 5000
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def available_formats():
+    """Formats whose writer is installed, in display order."""
+    formats = ["csv", "parquet"]
+    if importlib.util.find_spec("openpyxl") is not None:
+        formats.append("xlsx")
+    return formats
+
+
+def iter_chunks(df, rows, columns=None, full=False, chunk_size=CHUNK_SIZE):
+    """Yield export-ready frames of at most `chunk_size` rows.
+
+    `columns` maps source column -> exported name (all columns, unrenamed, when None).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    for start in range(0, max(len(rows), 1), chunk_size):
+        chunk = df.iloc[rows[start:start + chunk_size]]
+        if columns is not None:
+            chunk = chunk[[c for c in columns if c in chunk.columns]].rename(columns=columns)
+        if full:
+            chunk = pd.concat([chunk, score_components(chunk).round(2)], axis=1)
+        # Catégories gardées telles quelles : valeurs manquantes vides en CSV/XLSX, nulles en Parquet
+        yield chunk
+
+
+def iter_csv(chunks):
+    """Encoded CSV text, one piece per chunk (header only with the first one)."""
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=(i == 0)).encode("utf-8")
+
+
+def _write_parquet(chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(chunks, out, sheet="Communes"):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet)
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            ws.append(list(chunk.columns))
+        for record in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            ws.append(list(record))
+    wb.save(out)
+
+
+def write_export(chunks, out, fmt):
+    """Write `chunks` (from iter_chunks) to the path or binary buffer `out` as `fmt`."""
+    if fmt == "csv":
+        if isinstance(out, (str, bytes)) or hasattr(out, "__fspath__"):
+            with open(out, "wb") as f:
+                for piece in iter_csv(chunks):
+                    f.write(piece)
+        else:
+            for piece in iter_csv(chunks):
+                out.write(piece)
+    elif fmt == "parquet":
+        _write_parquet(chunks, out)
+    elif fmt == "xlsx":
+        _write_xlsx(chunks, out)
+    else:
+        raise ValueError(f"unsupported export format: {fmt!r}")
+
+
+def export_bytes(df, rows, fmt, columns=None, full=False, chunk_size=CHUNK_SIZE):
+    """The whole export as bytes (for a download button)."""
+    buffer = io.BytesIO()
+    write_export(iter_chunks(df, rows, columns, full, chunk_size), buffer, fmt)
+    return buffer.getvalue()
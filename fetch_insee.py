@@ -1,39 +1,237 @@
 """fetch_insee.py
 Fetch all French communes from geo.api.gouv.fr and save to cities_insee.csv
+
+Communes are fetched department by department on a pooled HTTP session with
+a few worker threads. Each response is decoded incrementally as it streams
+in and written to its own Parquet part under .cache/insee/. A manifest keeps
+every department's ETag/Last-Modified, so later runs send conditional
+requests and skip unchanged departments (HTTP 304). Departments the API
+answers with 404 are recorded as absent and not requested again (until
+--refresh). The manifest also lists the departments still pending, so an
+interrupted run resumes where it stopped.
+The parts are combined into the output file once every department is in.
+
+    python fetch_insee.py [--output cities_insee.csv] [--workers 8] [--refresh]
+    python fetch_insee.py --base-url http://127.0.0.1:8000   # local stand-in server
 """
-import requests
+import argparse
+import codecs
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BASE_URL = "https://geo.api.gouv.fr"
+FIELDS = "nom,code,codeDepartement,codeRegion,population,centre"
+STATE_DIR = Path(__file__).parent / ".cache" / "insee"
+COLUMNS = ["nom", "code", "codeDepartement", "codeRegion", "population", "lat", "lon"]
+# Collectivités d'outre-mer absentes de /departements mais servies par l'API communes
+EXTRA_DEPARTEMENTS = ("975", "977", "978", "984", "986", "987", "988", "989")
+
+
+def make_session(workers=8, retries=3):
+    """requests.Session with a connection pool sized for `workers` and retry on transient errors."""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-URL = (
-    "https://geo.api.gouv.fr/communes?fields=nom,code,codeDepartement,codeRegion,population,centre&format=json&geometry=centre&limit=50000"
-)
 
+def iter_json_array(chunks):
+    """Yield the objects of a top-level JSON array from an iterable of text chunks."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,[":
+                pos += 1
+            if pos >= len(buf) or buf[pos] == "]":
+                break
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # objet incomplet : attendre le bloc suivant
+            yield obj
+        buf = buf[pos:]
+    if buf.strip() not in ("", "]"):
+        raise ValueError("truncated JSON array in response")
 
-def fetch(save_path="cities_insee.csv"):
-    print("Fetching communes from geo.api.gouv.fr...")
-    r = requests.get(URL, timeout=30)
+
+def _row(c):
+    centre = c.get("centre") or {}
+    coords = centre.get("coordinates") if isinstance(centre, dict) else None
+    lon, lat = (coords[0], coords[1]) if coords and len(coords) >= 2 else (None, None)
+    return (
+        c.get("nom"),
+        c.get("code"),
+        c.get("codeDepartement"),
+        c.get("codeRegion"),
+        c.get("population") or 0,
+        lat,
+        lon,
+    )
+
+
+def list_departements(session, base_url=BASE_URL, timeout=30):
+    r = session.get(f"{base_url}/departements", params={"fields": "code"}, timeout=timeout)
     r.raise_for_status()
-    data = r.json()
-    rows = []
-    for c in data:
-        centre = c.get("centre") or {}
-        coords = centre.get("coordinates") if isinstance(centre, dict) else None
-        lon, lat = (coords[0], coords[1]) if coords and len(coords) >= 2 else (None, None)
-        rows.append(
-            {
-                "nom": c.get("nom"),
-                "code": c.get("code"),
-                "codeDepartement": c.get("codeDepartement"),
-                "codeRegion": c.get("codeRegion"),
-                "population": c.get("population") or 0,
-                "lat": lat,
-                "lon": lon,
+    codes = [d["code"] for d in r.json()]
+    return codes + [c for c in EXTRA_DEPARTEMENTS if c not in codes]
+
+
+def fetch_departement(session, code, part_path, state=None, base_url=BASE_URL, timeout=30):
+    """Fetch one department into `part_path`. Returns its new manifest entry.
+
+    `state` is the previous manifest entry; its validators make the request
+    conditional and the entry is returned unchanged on HTTP 304. On HTTP 404
+    no part is written and the entry is marked absent.
+    """
+    state = state or {}
+    headers = {}
+    if part_path.exists():
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    url = f"{base_url}/departements/{code}/communes"
+    params = {"fields": FIELDS, "format": "json", "geometry": "centre"}
+    with session.get(url, params=params, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            return dict(state, status="unchanged")
+        if r.status_code == 404:
+            part_path.unlink(missing_ok=True)
+            return {
+                "absent": True,
+                "rows": 0,
+                "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "status": "absent",
             }
-        )
-    df = pd.DataFrame(rows)
-    df.to_csv(save_path, index=False)
+        r.raise_for_status()
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")()
+        text = (decoder.decode(chunk) for chunk in r.iter_content(chunk_size=1 << 16))
+        rows = [_row(c) for c in iter_json_array(text)]
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["population"] = df["population"].astype("int64")
+    tmp = part_path.with_suffix(".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, part_path)
+    return {
+        "etag": etag,
+        "last_modified": last_modified,
+        "rows": len(df),
+        "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "status": "updated",
+    }
+
+
+def _load_manifest(path):
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {"departements": {}, "pending": []}
+
+
+def _save_manifest(manifest, path):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def combine(codes, state_dir=STATE_DIR, save_path="cities_insee.csv"):
+    """Concatenate the non-empty department parts into `save_path` (CSV or Parquet)."""
+    paths = [state_dir / f"{code}.parquet" for code in codes]
+    parts = [part for part in (pd.read_parquet(path) for path in paths if path.exists()) if len(part)]
+    if not parts:
+        parts = [pd.DataFrame(columns=COLUMNS)]
+    df = pd.concat(parts, ignore_index=True).sort_values("code", kind="stable").reset_index(drop=True)
+    if str(save_path).lower().endswith(".parquet"):
+        df.to_parquet(save_path, index=False)
+    else:
+        df.to_csv(save_path, index=False)
+    return df
+
+
+def fetch(save_path="cities_insee.csv", base_url=BASE_URL, workers=8, state_dir=STATE_DIR, refresh=False, timeout=30):
+    """Fetch (or refresh) every department, then write `save_path`. Returns the number of failures."""
+    state_dir = Path(state_dir)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = state_dir / "manifest.json"
+    manifest = _load_manifest(manifest_path)
+    session = make_session(workers)
+
+    print(f"Fetching communes from {base_url} ...")
+    codes = list_departements(session, base_url, timeout)
+    if refresh:
+        manifest = {"departements": {}, "pending": []}
+    if manifest["pending"]:
+        todo = [c for c in manifest["pending"] if c in codes]
+        print(f"Resuming interrupted run: {len(todo)} departments left")
+    else:
+        # Départements absents de l'API (404) : plus interrogés, sauf avec --refresh
+        todo = [c for c in codes if not manifest["departements"].get(c, {}).get("absent")]
+    manifest["pending"] = list(todo)
+    manifest["departements"] = {c: s for c, s in manifest["departements"].items() if c in codes}
+    _save_manifest(manifest, manifest_path)
+
+    failed, updated, unchanged = [], 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                fetch_departement, session, code, state_dir / f"{code}.parquet",
+                manifest["departements"].get(code), base_url, timeout,
+            ): code
+            for code in todo
+        }
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                failed.append(code)
+                print(f"WARNING: department {code} failed ({e})")
+                continue
+            status = entry.pop("status")
+            if status == "unchanged":
+                unchanged += 1
+            elif status == "updated":
+                updated += 1
+            manifest["departements"][code] = entry
+            manifest["pending"].remove(code)
+            _save_manifest(manifest, manifest_path)
+
+    absent = sum(1 for c in codes if manifest["departements"].get(c, {}).get("absent"))
+    print(f"{updated} departments updated, {unchanged} unchanged, {absent} absent, {len(failed)} failed")
+    if failed:
+        print("Re-run to resume the failed departments:", sorted(failed))
+        return len(failed)
+    df = combine(codes, state_dir, save_path)
     print(f"Saved {len(df)} communes to {save_path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch French communes from geo.api.gouv.fr.")
+    parser.add_argument("-o", "--output", default="cities_insee.csv")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--state-dir", default=str(STATE_DIR))
+    parser.add_argument("--refresh", action="store_true", help="ignore cached validators and refetch everything")
+    args = parser.parse_args(argv)
+    return 1 if fetch(args.output, args.base_url, args.workers, args.state_dir, args.refresh) else 0
 
 
 if __name__ == "__main__":
-    fetch()
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""filters.py
+Index-backed filter engine for the sidebar filters.
+
+`FilterIndex` is built once per scored table. Numeric thresholds are answered
+with `searchsorted` on pre-sorted columns, region and priority with packed
+bitmaps and the search box with `search.SearchIndex`. Every per-filter bitmap
+is memoised by its value so a rerun where only one filter changed recomputes
+just that one. Results are row positions
+into the indexed frame; the frame itself is never copied.
+
+One index is shared by every dashboard session, so the memoised bitmaps,
+sort orders and last mask are guarded by a lock; bitmaps are built outside it.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from search import SearchIndex
+
+NUMERIC_FILTERS = ("population", "revenuAnnuel", "score")
+SORT_COLUMNS = ("revenuAnnuel", "score", "clientsPotentiels", "population")
+
+
+@dataclass(frozen=True)
+class FilterState:
+    """Sidebar filter values. `region=None` and empty `priorities` mean "all"."""
+    search: str = ""
+    region: str = None
+    priorities: tuple = ()
+    min_population: float = 0
+    min_revenue: float = 0
+    min_score: float = 0
+
+    def canonical(self):
+        """Equivalent state in normal form (trimmed lower-case search, sorted priorities, float thresholds)."""
+        return FilterState(
+            search=" ".join(self.search.split()).lower(),
+            region=self.region,
+            priorities=tuple(sorted(set(self.priorities))),
+            min_population=float(self.min_population),
+            min_revenue=float(self.min_revenue),
+            min_score=float(self.min_score),
+        )
+
+    def key(self):
+        """Stable hash of the canonical state, usable as a cache key across sessions and processes."""
+        payload = json.dumps(asdict(self.canonical()), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class FilterIndex:
+    def __init__(self, df, cache_size=64):
+        self.df = df
+        self.n = len(df)
+        self._cache_size = cache_size
+        self._components = OrderedDict()
+        self._orders = {}
+        self._last = None
+        self._lock = threading.Lock()
+
+        # Colonnes numériques triées + rang de chaque ligne dans l'ordre trié
+        self._sorted = {}
+        self._rank = {}
+        for col in NUMERIC_FILTERS:
+            values = df[col].to_numpy()
+            order = np.argsort(values, kind="stable")
+            rank = np.empty(self.n, dtype=np.int64)
+            rank[order] = np.arange(self.n)
+            self._sorted[col] = values[order]
+            self._rank[col] = rank
+
+        self._search_index = None
+        self._all = np.packbits(np.ones(self.n, dtype=bool))
+        self._region = self._bitmaps(df["region"])
+        self._priority = self._bitmaps(df["priorite"])
+
+    @property
+    def search_index(self):
+        """Name/code search index, built on the first search."""
+        if self._search_index is None:
+            index = SearchIndex.from_frame(self.df)
+            with self._lock:
+                if self._search_index is None:
+                    self._search_index = index
+        return self._search_index
+
+    def _bitmaps(self, series):
+        codes, uniques = series.factorize()
+        return {
+            value: np.packbits(codes == code) for code, value in enumerate(uniques)
+        }
+
+    def clear_cache(self):
+        """Forget memoised bitmaps, sort orders and the last mask (the indexes themselves are kept)."""
+        with self._lock:
+            self._components.clear()
+            self._orders.clear()
+            self._last = None
+
+    def _memo(self, key, build):
+        with self._lock:
+            bitmap = self._components.get(key)
+            if bitmap is not None:
+                self._components.move_to_end(key)
+                return bitmap
+        bitmap = build()
+        with self._lock:
+            self._components[key] = bitmap
+            self._components.move_to_end(key)
+            while len(self._components) > self._cache_size:
+                self._components.popitem(last=False)
+        return bitmap
+
+    # --- Composants ---------------------------------------------------------
+
+    def _threshold(self, col, minimum):
+        pos = int(np.searchsorted(self._sorted[col], minimum, side="left"))
+        if pos == 0:
+            return self._all
+        # Les seuils qui tombent à la même position partagent le même bitmap
+        return self._memo((col, pos), lambda: np.packbits(self._rank[col] >= pos))
+
+    def _region_mask(self, region):
+        if region is None:
+            return self._all
+        return self._region.get(region, np.zeros_like(self._all))
+
+    def _priority_mask(self, priorities):
+        if not priorities:
+            return self._all
+
+        def build():
+            mask = np.zeros_like(self._all)
+            for p in priorities:
+                if p in self._priority:
+                    mask |= self._priority[p]
+            return mask
+
+        return self._memo(("priorite", tuple(sorted(priorities))), build)
+
+    def _search_mask(self, term):
+        if not term:
+            return self._all
+
+        def build():
+            match = np.zeros(self.n, dtype=bool)
+            match[self.search_index.matches(term)] = True
+            return np.packbits(match)
+
+        return self._memo(("search", term), build)
+
+    # --- Requêtes -----------------------------------------------------------
+
+    def mask(self, state):
+        """Boolean mask (length n) of rows matching `state`."""
+        with self._lock:
+            last = self._last
+        if last is not None and last[0] == state:
+            return last[1]
+        bitmap = self._search_mask(state.search)
+        for part in (
+            self._region_mask(state.region),
+            self._priority_mask(state.priorities),
+            self._threshold("population", state.min_population),
+            self._threshold("revenuAnnuel", state.min_revenue),
+            self._threshold("score", state.min_score),
+        ):
+            bitmap = bitmap & part
+        mask = np.unpackbits(bitmap, count=self.n).astype(bool)
+        mask.flags.writeable = False
+        with self._lock:
+            self._last = (state, mask)
+        return mask
+
+    def rows(self, state):
+        """Positions of matching rows, in table order."""
+        return np.flatnonzero(self.mask(state))
+
+    def order(self, col, ascending=True):
+        """Stable sort order of the whole table on `col` (cached)."""
+        key = (col, ascending)
+        with self._lock:
+            order = self._orders.get(key)
+        if order is None:
+            values = self.df[col].to_numpy(dtype=np.float64)  # signé : -values reste correct pour les colonnes uint8
+            order = np.argsort(values if ascending else -values, kind="stable")
+            order.flags.writeable = False
+            with self._lock:
+                order = self._orders.setdefault(key, order)
+        return order
+
+    def sorted_rows(self, state, sort_by, ascending=False):
+        """Positions of matching rows ordered by `sort_by`, without a per-rerun sort."""
+        order = self.order(sort_by, ascending)
+        return order[self.mask(state)[order]]
+
+    def count(self, state):
+        """Number of matching rows."""
+        return int(np.count_nonzero(self.mask(state)))
+
+    def top_rows(self, state, sort_by, ascending=False, k=None):
+        """First `k` rows of `sorted_rows()`, selected with a partition instead of a full ordering.
+
+        Ties are broken by table position, so the result is exactly a prefix of `sorted_rows()`.
+        """
+        rows = self.rows(state)
+        if k is None or k >= len(rows):
+            return self.sorted_rows(state, sort_by, ascending)
+        if k <= 0:
+            return rows[:0]
+        values = self.df[sort_by].to_numpy(dtype=np.float64)[rows]
+        key = values if ascending else -values
+        kth = np.partition(key, k - 1)[k - 1]
+        below = np.flatnonzero(key < kth)
+        ties = np.flatnonzero(key == kth)[:k - len(below)]
+        sel = np.concatenate([below, ties])
+        return rows[sel[np.lexsort((sel, key[sel]))]]
+
+    def page(self, state, sort_by, ascending=False, page=0, page_size=50):
+        """Rows of page `page` (0-based) of the sorted results."""
+        start = page * page_size
+        return self.top_rows(state, sort_by, ascending, start + page_size)[start:]
@@ -0,0 +1,189 @@
+"""generate_data.py
+Seeded synthetic communes in the data.csv schema, at any scale.
+
+Departments, regions, locations and populations are taken from a reference
+file (data.csv by default). Rows are drawn in fixed-size blocks,
+each with its own generator derived from (seed, block number), so the output
+only depends on the seed and the row count, and each block is written before
+the next one is drawn: memory stays bounded at millions of rows.
+
+Distributions follow the national data:
+- population: drawn from the reference populations (same quantiles and share
+  of empty communes as data.csv);
+- an urban index (log population plus noise) drives pct_appartement up and
+  pct_maison (= 100 - pct_appartement), plus60ans and tauxProprietaires down;
+- revenuMedian combines a department effect with a small urban premium;
+- each row is placed near a reference commune drawn at random (a few km of
+  jitter), so the density follows the real map and every point stays in
+  France (including overseas departments).
+Names combine common name parts with a number derived from the row index,
+so every (nom, departement) pair is unique and rows keep a stable identity.
+The age shares never add up to more than 100 and pct_maison + pct_appartement
+is exactly 100, as in data.csv.
+The score column is computed with scoring.compute_score.
+
+    python generate_data.py                      # 5 000 rows -> cities_data.csv
+    python generate_data.py -n 3000000 -o synth.parquet --seed 42
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scoring import compute_score
+
+BLOCK_ROWS = 1 << 16
+REFERENCE_PATH = Path(__file__).parent / "data.csv"
+JITTER_DEG = 0.02
+COLUMNS = [
+    "nom", "population", "plus60ans", "pct_15_29", "pct_30_44", "pct_45_59", "pct_maison",
+    "pct_appartement", "revenuMedian", "tauxProprietaires", "region", "zoneChalandise",
+    "departement", "lat", "lon", "score",
+]
+
+# Morceaux de noms de communes
+_PREFIXES = np.array(["", "", "", "", "SAINT-", "SAINTE-", "LE ", "LA ", "LES ", "VILLE", "MONT", "FONTAINE-"])
+_ROOTS = np.array([
+    "AUBIGNY", "BEAUMONT", "BELLEVUE", "BOIS", "BRUYERES", "CHAMPAGNE", "CHATEAU", "CHAUMONT", "CROIX",
+    "ESTREES", "FERRIERES", "GRANDVILLE", "LANDES", "LAURENT", "MARTIN", "MESNIL", "MOULINS", "NEUVILLE",
+    "PIERRE", "PLESSIS", "PONT", "ROCHE", "SAULX", "THIERRY", "VAUX", "VERNEUIL", "VILLIERS", "VINCENT",
+])
+_SUFFIXES = np.array([
+    "", "", "", "", "", "-SUR-LOIRE", "-SUR-MER", "-EN-BRIE", "-LES-BAINS", "-LE-CHATEAU", "-SUR-SEINE",
+    "-EN-VEXIN", "-DU-BOIS", "-LA-FORET", "-SOUS-BOIS",
+])
+
+
+def reference_table(reference=REFERENCE_PATH):
+    """Reference communes (population, region, departement, lat, lon) with a department number `dep`."""
+    ref = pd.read_csv(reference, sep=";", encoding="utf-8-sig",
+                      usecols=["population", "region", "departement", "lat", "lon"], dtype={"departement": str})
+    ref["dep"] = pd.factorize(ref["departement"], sort=True)[0]
+    return ref
+
+
+def _departement_effects(ref, seed):
+    """Income offset (€) per department, fixed by the seed."""
+    rng = np.random.default_rng([seed, 0xDE])
+    return rng.normal(0, 1500, ref["dep"].max() + 1)
+
+
+def generate_block(ref, block, size, seed=0, income_effect=None):
+    """Rows of block number `block` (each block has its own seeded generator)."""
+    rng = np.random.default_rng([seed, block])
+    if income_effect is None:
+        income_effect = _departement_effects(ref, seed)
+
+    r = rng.integers(0, len(ref), size)
+    d = ref["dep"].to_numpy()[r]
+    population = ref["population"].to_numpy(dtype=np.int64)[rng.integers(0, len(ref), size)]
+    urban = (np.log1p(population) - 6.1) / 1.6 + rng.normal(0, 1.0, size)
+
+    pct_appartement = np.clip(np.rint(10 + 9.5 * np.exp(0.35 * urban + rng.normal(0, 0.25, size))), 10, 90).astype(np.int64)
+    pct_maison = 100 - pct_appartement
+
+    def share(mean, slope, sd, lo, hi):
+        return np.round(np.clip(mean + slope * urban + rng.normal(0, sd, size), lo, hi), 1)
+
+    plus60ans = share(30.0, -1.0, 2.7, 15, 35)
+    pct_15_29 = share(15.0, 0.6, 1.6, 12, 30)
+    pct_30_44 = share(18.5, 0.3, 1.9, 15, 25)
+    pct_45_59 = share(22.5, -0.2, 1.4, 15, 25)
+    # Les tranches d'âge (15 ans et plus) ne dépassent jamais 99 % au total
+    ages = np.column_stack([plus60ans, pct_15_29, pct_30_44, pct_45_59])
+    ages = np.floor(ages * np.minimum(1, 99 / ages.sum(axis=1))[:, None] * 10) / 10
+    plus60ans, pct_15_29, pct_30_44, pct_45_59 = ages.T
+
+    revenu = 21500 + income_effect[d] + 300 * urban + rng.normal(0, 2000, size)
+    revenu_median = (np.rint(np.clip(revenu, 17000, 26000) / 100) * 100).astype(np.int64)
+    taux_proprietaires = np.clip(np.rint(57 - 2.5 * urban + rng.normal(0, 6.5, size)), 30, 69).astype(np.int64)
+    zone = np.clip(np.rint(375 + 8 * urban + rng.normal(0, 42, size)), 300, 599).astype(np.int64)
+
+    lat = ref["lat"].to_numpy()[r] + np.clip(rng.normal(0, JITTER_DEG, size), -2.5 * JITTER_DEG, 2.5 * JITTER_DEG)
+    lon = ref["lon"].to_numpy()[r] + np.clip(rng.normal(0, JITTER_DEG, size), -2.5 * JITTER_DEG, 2.5 * JITTER_DEG)
+
+    # Numéro tiré de la position de la ligne : un nom unique par ligne, quel que soit le volume
+    number = pd.Series(np.arange(block * BLOCK_ROWS, block * BLOCK_ROWS + size) + 1).astype(str).to_numpy(dtype=object)
+    names = (
+        _PREFIXES[rng.integers(0, len(_PREFIXES), size)].astype(object)
+        + _ROOTS[rng.integers(0, len(_ROOTS), size)].astype(object)
+        + _SUFFIXES[rng.integers(0, len(_SUFFIXES), size)].astype(object)
+        + "-" + number
+    )
+
+    df = pd.DataFrame({
+        "nom": names,
+        "population": population,
+        "plus60ans": plus60ans,
+        "pct_15_29": pct_15_29,
+        "pct_30_44": pct_30_44,
+        "pct_45_59": pct_45_59,
+        "pct_maison": pct_maison,
+        "pct_appartement": pct_appartement,
+        "revenuMedian": revenu_median,
+        "tauxProprietaires": taux_proprietaires,
+        "region": ref["region"].to_numpy()[r],
+        "zoneChalandise": zone,
+        "departement": ref["departement"].to_numpy()[r],
+        "lat": np.round(lat, 6),
+        "lon": np.round(lon, 6),
+    })
+    df["score"] = compute_score(df)
+    return df[COLUMNS]
+
+
+def iter_blocks(n, seed=0, reference=REFERENCE_PATH):
+    """Yield the `n` synthetic rows block by block."""
+    ref = reference_table(reference)
+    effects = _departement_effects(ref, seed)
+    for block, start in enumerate(range(0, n, BLOCK_ROWS)):
+        yield generate_block(ref, block, min(BLOCK_ROWS, n - start), seed, effects)
+
+
+def generate(n, seed=0, reference=REFERENCE_PATH):
+    """All `n` rows as one DataFrame (for in-memory use; prefer write() at large scale)."""
+    return pd.concat(iter_blocks(n, seed, reference), ignore_index=True)
+
+
+def write(path, n, seed=0, reference=REFERENCE_PATH):
+    """Stream `n` rows to `path` (.parquet, otherwise data.csv-style ';' CSV). Returns the row count."""
+    path = Path(path)
+    written = 0
+    if path.suffix.lower() == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for df in iter_blocks(n, seed, reference):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(df)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            for i, df in enumerate(iter_blocks(n, seed, reference)):
+                df.to_csv(f, sep=";", index=False, header=(i == 0))
+                written += len(df)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic communes in the data.csv schema.")
+    parser.add_argument("-n", "--rows", type=int, default=5000)
+    parser.add_argument("-o", "--output", default="cities_data.csv", help=".csv (';' separated) or .parquet")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reference", default=str(REFERENCE_PATH), help="data.csv-schema file giving departments and locations")
+    args = parser.parse_args(argv)
+    written = write(args.output, args.rows, args.seed, args.reference)
+    print(f"Saved {written} synthetic communes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""map_layers.py
+Server-side level-of-detail preparation for the pydeck map.
+
+At low zoom the filtered communes are binned into lat/lon grid cells whose
+size follows the zoom level, and only the per-cell aggregates are sent to the
+browser. Past `POINTS_ZOOM` the individual communes inside the viewport are
+sent instead (capped at `MAX_POINTS`).
+"""
+import numpy as np
+import pandas as pd
+
+TILE_PX = 256
+CELL_PX = 40              # taille visée d'une cellule à l'écran
+VIEWPORT_PX = (1200, 600)  # viewport approximatif (largeur, hauteur)
+POINTS_ZOOM = 9
+MAX_POINTS = 5000
+
+
+def cell_size_deg(zoom):
+    """Grid cell size (degrees) giving cells of about CELL_PX pixels at `zoom`."""
+    return CELL_PX * 360.0 / (TILE_PX * 2 ** zoom)
+
+
+def score_colors(scores, alpha=160):
+    """Vectorized score_to_rgb(): red->green ramp, returned as an (n, 4) int array."""
+    scores = np.asarray(scores, dtype=np.float64)
+    red = (255 * (100 - scores) / 100).astype(np.int64)
+    green = (255 * scores / 100).astype(np.int64)
+    return np.column_stack([red, green, np.zeros_like(red), np.full_like(red, alpha)])
+
+
+def aggregate_cells(df, cell_deg):
+    """Per-cell totals and averages of the communes in `df`."""
+    ix = np.floor(df["lon"].to_numpy() / cell_deg).astype(np.int64)
+    iy = np.floor(df["lat"].to_numpy() / cell_deg).astype(np.int64)
+    cells = (
+        pd.DataFrame({
+            "ix": ix,
+            "iy": iy,
+            "revenuAnnuel": df["revenuAnnuel"].to_numpy(),
+            "clientsPotentiels": df["clientsPotentiels"].to_numpy(),
+            "population": df["population"].to_numpy(),
+            "score": df["score"].to_numpy(),
+        })
+        .groupby(["ix", "iy"], sort=False)
+        .agg(
+            nbCommunes=("score", "size"),
+            revenuAnnuel=("revenuAnnuel", "sum"),
+            clientsPotentiels=("clientsPotentiels", "sum"),
+            population=("population", "sum"),
+            scoreMoyen=("score", "mean"),
+        )
+        .reset_index()
+    )
+    cells["revenuMoyen"] = cells["revenuAnnuel"] / cells["nbCommunes"]
+    cells["scoreMoyen"] = cells["scoreMoyen"].round(1)
+
+    lon0 = cells["ix"].to_numpy() * cell_deg
+    lat0 = cells["iy"].to_numpy() * cell_deg
+    cells["polygon"] = [
+        [[x, y], [x + cell_deg, y], [x + cell_deg, y + cell_deg], [x, y + cell_deg]]
+        for x, y in zip(lon0.tolist(), lat0.tolist())
+    ]
+    cells["color"] = score_colors(cells["scoreMoyen"]).tolist()
+    return cells.drop(columns=["ix", "iy"])
+
+
+def viewport_bounds(lat, lon, zoom):
+    """(lat_min, lat_max, lon_min, lon_max) visible around (lat, lon) at `zoom`."""
+    deg_per_px = 360.0 / (TILE_PX * 2 ** zoom)
+    half_w = VIEWPORT_PX[0] / 2 * deg_per_px
+    half_h = VIEWPORT_PX[1] / 2 * deg_per_px * np.cos(np.radians(lat))
+    return lat - half_h, lat + half_h, lon - half_w, lon + half_w
+
+
+def visible_points(df, lat, lon, zoom, limit=MAX_POINTS):
+    """Communes inside the viewport, highest revenue first, at most `limit` rows."""
+    lat_min, lat_max, lon_min, lon_max = viewport_bounds(lat, lon, zoom)
+    inside = df["lat"].between(lat_min, lat_max) & df["lon"].between(lon_min, lon_max)
+    points = df.loc[inside, ["nom", "departement", "lat", "lon", "score", "revenuAnnuel", "clientsPotentiels", "priorite"]]
+    if len(points) > limit:
+        points = points.nlargest(limit, "revenuAnnuel")
+    points = points.reset_index(drop=True)
+    points["priorite"] = points["priorite"].astype(str)
+    points["color"] = score_colors(points["score"]).tolist()
+    return points
+
+
+def map_data(df, zoom, center=None):
+    """("cells", aggregates) below POINTS_ZOOM, ("points", communes around `center`) from it.
+
+    `center` (lat, lon) is only used in points mode; it defaults to the median commune.
+    """
+    if zoom >= POINTS_ZOOM:
+        if center is None:
+            center = (df["lat"].median(), df["lon"].median())
+        return "points", visible_points(df, center[0], center[1], zoom)
+    return "cells", aggregate_cells(df, cell_size_deg(zoom))
@@ -0,0 +1,185 @@
+"""pareto.py
+Pareto-optimal (skyline) communes over several metrics, and successive layers.
+
+A commune dominates another when it is at least as good on every metric and
+strictly better on one. Layer 0 is the skyline (communes nobody dominates),
+layer 1 the skyline of what remains, and so on.
+
+Identical metric vectors are collapsed first (they never dominate each other
+and always share a layer). Two metrics use a sort-and-sweep: points sorted by
+the first metric, each layer keeps the best second metric seen so far and a
+point goes to the first layer it is not dominated by (binary search), all
+layers in O(n log n). Three metrics or more use sort-filter-skyline: points
+sorted by the sum of their ranks, which a dominating point always exceeds, are
+checked block by block against the skyline found so far, so each candidate
+is compared to the skyline only, never to all n points. Layers repeat that
+on the points left.
+"""
+import bisect
+
+import numpy as np
+import pandas as pd
+
+# Métriques proposées (à maximiser, sauf indication contraire)
+OBJECTIVES = {
+    "score": "Score",
+    "revenuAnnuel": "Revenu annuel",
+    "clientsPotentiels": "Clients potentiels",
+    "tauxProprietaires": "% propriétaires",
+    "pct_maison": "% maisons",
+    "revenuMedian": "Revenu médian",
+    "plus60ans": "% 60 ans et +",
+    "population": "Population",
+}
+# Le coût et la taille des couches croissent vite avec le nombre de critères
+MAX_OBJECTIVES = 5
+DISPLAY_LIMIT = 500
+BLOCK = 256
+
+
+def _dominated_by(candidates, front, step=64):
+    """Mask of `candidates` rows dominated by at least one `front` row.
+
+    Rows are distinct, so "at least as good everywhere" already means
+    "dominates". The front is taken `step` rows at a time, strongest first,
+    and candidates already dominated are dropped before the next slice.
+    """
+    alive = np.arange(len(candidates))
+    for start in range(0, len(front), step):
+        if len(alive) == 0:
+            break
+        ge = (front[None, start:start + step, :] >= candidates[alive][:, None, :]).all(axis=2)
+        alive = alive[~ge.any(axis=1)]
+    out = np.ones(len(candidates), dtype=bool)
+    out[alive] = False
+    return out
+
+
+def _skyline_sfs(ranks):
+    """Positions of the non-dominated rows of `ranks` (distinct rows of per-column ranks)."""
+    order = np.argsort(-ranks.sum(axis=1, dtype=np.int64), kind="stable")
+    front = np.empty((0, ranks.shape[1]), dtype=ranks.dtype)
+    keep = []
+    for start in range(0, len(order), BLOCK):
+        block = order[start:start + BLOCK]
+        values = ranks[block]
+        alive = ~_dominated_by(values, front)
+        block, values = block[alive], values[alive]
+        # Dans le bloc : comparaison deux à deux, sans la diagonale
+        ge = (values[:, None, :] >= values[None, :, :]).all(axis=2)
+        np.fill_diagonal(ge, False)
+        alive = ~ge.any(axis=0)
+        keep.append(block[alive])
+        front = np.concatenate([front, values[alive]])
+    return np.concatenate(keep) if keep else np.empty(0, dtype=np.int64)
+
+
+def _layers_2d(points, max_layers):
+    order = np.lexsort((-points[:, 1], -points[:, 0]))
+    # Opposé de la meilleure 2e métrique vue par couche (croissant) : la première
+    # couche dont aucun point ne domine le point courant est trouvée par bisection
+    neg_best = []
+    layer = np.full(len(points), -1, dtype=np.int64)
+    for i, neg_y in zip(order.tolist(), (-points[order, 1]).tolist()):
+        k = bisect.bisect_right(neg_best, neg_y)
+        if k == len(neg_best):
+            if max_layers is not None and k >= max_layers:
+                continue
+            neg_best.append(neg_y)
+        else:
+            neg_best[k] = neg_y
+        layer[i] = k
+    return layer
+
+
+def pareto_layers(values, max_layers=None):
+    """Layer of each row of `values` (n x d, higher is better); -1 beyond `max_layers`."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim != 2 or values.shape[1] == 0:
+        raise ValueError("values must be an (n, d) array with d >= 1")
+    layer = np.full(len(values), -1, dtype=np.int64)
+    if len(values) == 0:
+        return layer
+    points, inverse = np.unique(values, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    d = points.shape[1]
+    if d == 1:
+        # Une seule métrique : chaque valeur distincte est une couche
+        unique_layer = len(points) - 1 - np.arange(len(points))
+        if max_layers is not None:
+            unique_layer[unique_layer >= max_layers] = -1
+    elif d == 2:
+        unique_layer = _layers_2d(points, max_layers)
+    else:
+        # Rangs par colonne (int32) : même relation de dominance, moins de mémoire à parcourir
+        ranks = np.column_stack([np.unique(points[:, j], return_inverse=True)[1].reshape(-1) for j in range(d)])
+        ranks = ranks.astype(np.int32)
+        unique_layer = np.full(len(points), -1, dtype=np.int64)
+        remaining = np.arange(len(points))
+        k = 0
+        while len(remaining) and (max_layers is None or k < max_layers):
+            front = remaining[_skyline_sfs(ranks[remaining])]
+            unique_layer[front] = k
+            remaining = np.setdiff1d(remaining, front, assume_unique=True)
+            k += 1
+    return unique_layer[inverse]
+
+
+def skyline(values):
+    """Mask of the non-dominated rows of `values`."""
+    return pareto_layers(values, max_layers=1) == 0
+
+
+def frame_values(df, columns, minimize=()):
+    """Metric matrix of `df` for pareto_layers(), negating the columns to minimize."""
+    values = np.column_stack([df[c].to_numpy(dtype=np.float64) for c in columns])
+    for j, c in enumerate(columns):
+        if c in minimize:
+            values[:, j] = -values[:, j]
+    return values
+
+
+def pareto_selection(df, columns, max_layers=3, minimize=(), limit=None):
+    """(communes per layer, rows of `df` in the first `max_layers` layers).
+
+    Rows carry a 1-based `couchePareto` column and come best layer first,
+    then by the first metric; at most `limit` of them are returned, while
+    the per-layer counts always cover every row.
+    """
+    values = frame_values(df, columns, minimize)
+    layer = pareto_layers(values, max_layers)
+    rows = np.flatnonzero(layer >= 0)
+    rows = rows[np.lexsort((-values[rows, 0], layer[rows]))]
+    if limit is not None:
+        rows = rows[:limit]
+    out = df.iloc[rows].copy()
+    out.insert(0, "couchePareto", layer[rows] + 1)
+    return layer_counts(layer), out
+
+
+def pareto_frame(df, columns, max_layers=3, minimize=(), limit=None):
+    """Rows of `df` in the first `max_layers` layers, with a 1-based `couchePareto` column, best layer first."""
+    return pareto_selection(df, columns, max_layers, minimize, limit)[1]
+
+
+def dominance_naive(values, max_layers=None):
+    """O(n^2) pairwise reference for pareto_layers() (checks and small inputs only)."""
+    values = np.asarray(values, dtype=np.float64)
+    layer = np.full(len(values), -1, dtype=np.int64)
+    remaining = np.arange(len(values))
+    k = 0
+    while len(remaining) and (max_layers is None or k < max_layers):
+        sub = values[remaining]
+        ge = (sub[:, None, :] >= sub[None, :, :]).all(axis=2)
+        gt = (sub[:, None, :] > sub[None, :, :]).any(axis=2)
+        dominated = (ge & gt).any(axis=0)
+        layer[remaining[~dominated]] = k
+        remaining = remaining[dominated]
+        k += 1
+    return layer
+
+
+def layer_counts(layer):
+    """Number of communes per (1-based) layer."""
+    counts = np.bincount(layer[layer >= 0])
+    return pd.DataFrame({"Couche": np.arange(1, len(counts) + 1), "Communes": counts})
@@ -0,0 +1,197 @@
+"""perf.py
+Per-stage timing of a dashboard rerun, switched by environment variable.
+
+ANALYSE_PERF selects the mode:
+- unset or "0": disabled. `start_run()` returns a no-op run whose stages are
+  one shared context manager, so instrumented code pays a method call per
+  stage and nothing else;
+- "1": every named stage records its wall time, row count and payload size.
+  At the end of the rerun one JSON line per run is appended to the log
+  (ANALYSE_PERF_LOG, default .cache/perf.jsonl) and the dashboard shows
+  percentiles over the session in its debug panel;
+- "profile": as "1", and the debug panel can run cProfile over the next
+  rerun; the .prof file is written next to the log.
+
+Payload sizes are measured when the run finishes, after every stage timing,
+so measuring them never inflates a stage.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MODE = os.environ.get("ANALYSE_PERF", "0").strip().lower()
+ENABLED = MODE not in ("", "0", "false", "off")
+PROFILING = MODE == "profile"
+LOG_PATH = Path(os.environ.get("ANALYSE_PERF_LOG", Path(__file__).parent / ".cache" / "perf.jsonl"))
+PERCENTILES = (50, 90, 99)
+
+
+def payload_bytes(obj):
+    """Approximate size in bytes of a stage's output (DataFrame, array, bytes, figure), or None."""
+    if obj is None:
+        return None
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage())
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if hasattr(obj, "to_json"):
+        # Figure Plotly : taille de ce qui est envoyé au navigateur
+        return len(obj.to_json())
+    return None
+
+
+class Stage:
+    """One timed stage; use as a context manager and `set()` what it produced."""
+
+    __slots__ = ("name", "rows", "payload", "start", "seconds")
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.payload = None
+        self.start = 0.0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        return False
+
+    def set(self, rows=None, payload=None):
+        if rows is not None:
+            self.rows = int(rows)
+        if payload is not None:
+            self.payload = payload
+
+    def record(self):
+        return {"stage": self.name, "ms": round(self.seconds * 1000, 3), "rows": self.rows,
+                "bytes": payload_bytes(self.payload)}
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, rows=None, payload=None):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Run:
+    """Stages of one rerun, written as a single JSON record by `finish()`."""
+
+    enabled = True
+
+    def __init__(self, session=None, log_path=LOG_PATH):
+        self.session = session
+        self.log_path = Path(log_path)
+        self.created = time.time()
+        self.stages = []
+        self.profiler = None
+        self._start = time.perf_counter()
+
+    def stage(self, name, rows=None):
+        stage = Stage(name, rows)
+        self.stages.append(stage)
+        return stage
+
+    def profile(self):
+        """Run cProfile from now until `finish()`."""
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def finish(self):
+        """Stop timing and profiling, append the run to the JSON log and return its record.
+
+        Call it from a `finally` block: a rerun or stop requested by Streamlit
+        interrupts the script, and the profiler must not outlive its run.
+        """
+        total = time.perf_counter() - self._start
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.disable()
+        record = {
+            "ts": round(self.created, 3),
+            "session": self.session,
+            "total_ms": round(total * 1000, 3),
+            "stages": [stage.record() for stage in self.stages],
+        }
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        if profiler is not None:
+            path = self.log_path.with_name(f"profile-{self.session or 'run'}-{int(self.created)}.prof")
+            profiler.dump_stats(path)
+            record["profile"] = str(path)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+
+class _NullRun:
+    enabled = False
+
+    def stage(self, name, rows=None):
+        return _NULL_STAGE
+
+    def profile(self):
+        pass
+
+    def finish(self):
+        return None
+
+
+NULL_RUN = _NullRun()
+
+
+def start_run(session=None, log_path=LOG_PATH):
+    """A recording run when ANALYSE_PERF is set, else the shared no-op run."""
+    return Run(session, log_path) if ENABLED else NULL_RUN
+
+
+def percentiles(records, q=PERCENTILES):
+    """Per-stage latency percentiles (ms) over run records, with the last row count and payload size."""
+    rows = [stage for record in records for stage in record["stages"]]
+    rows += [{"stage": "total", "ms": record["total_ms"], "rows": None, "bytes": None} for record in records]
+    if not rows:
+        return pd.DataFrame(columns=["stage", "n", *[f"p{p}_ms" for p in q], "max_ms", "rows", "bytes"])
+    frame = pd.DataFrame(rows)
+    out = []
+    for name, group in frame.groupby("stage", sort=False):
+        ms = group["ms"].to_numpy()
+        last = group.iloc[-1]
+        out.append({
+            "stage": name,
+            "n": len(ms),
+            **{f"p{p}_ms": float(np.percentile(ms, p)) for p in q},
+            "max_ms": float(ms.max()),
+            "rows": last["rows"],
+            "bytes": last["bytes"],
+        })
+    return pd.DataFrame(out).round(2)
+
+
+def profile_report(path, limit=25, sort="cumulative"):
+    """Text summary of a .prof file: the `limit` functions with the highest `sort` time."""
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,190 @@
+"""pipeline.py
+Headless entry point to the scoring pipeline (no Streamlit, Plotly or pydeck).
+
+Importing this module only loads the standard library; pandas, NumPy and the
+engine modules are imported on first use, so batch jobs and CI checks start
+fast and never touch the Streamlit runtime.
+
+Command line:
+
+    python pipeline.py data.csv -o scored.parquet
+    python pipeline.py communes.parquet -o top.csv --priorite A B --min-score 60
+"""
+import argparse
+import sys
+from pathlib import Path
+
+DATA_PATH = Path(__file__).parent / "data.csv"
+SORT_COLUMNS = ("revenuAnnuel", "score", "clientsPotentiels", "population")
+# Codes lus comme texte : "01" reste "01" même sans ligne corse ("2A"/"2B") dans le fichier
+SOURCE_DTYPES = {"departement": str, "code": str}
+
+
+def csv_separator(path):
+    """';' or ',', whichever the header line of the CSV file uses more."""
+    with open(path, encoding="utf-8-sig") as f:
+        header = f.readline()
+    return ";" if header.count(";") > header.count(",") else ","
+
+
+def read_table(path):
+    """Read a communes table from CSV (';' or ',' separated), Parquet or Feather."""
+    import pandas as pd
+
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        return pd.read_parquet(path)
+    if suffix in (".feather", ".arrow"):
+        return pd.read_feather(path)
+    return pd.read_csv(path, sep=csv_separator(path), encoding="utf-8-sig", dtype=SOURCE_DTYPES)
+
+
+def write_table(df, path):
+    """Write `df` as CSV, Parquet, Feather or XLSX depending on the file extension."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".xlsx":
+        from export import iter_chunks, write_export
+
+        write_export(iter_chunks(df, range(len(df))), path, "xlsx")
+    elif suffix == ".parquet":
+        df.to_parquet(path, index=False)
+    elif suffix in (".feather", ".arrow"):
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8")
+
+
+def load_data(csv_path=DATA_PATH):
+    """Scored communes table for `csv_path`, served from the on-disk cache."""
+    from dataset_cache import load_scored
+
+    return load_scored(csv_path)
+
+
+def load_shared(csv_path=DATA_PATH):
+    """Read-only, memory-mapped scored table meant to be shared across threads or sessions."""
+    from dataset_cache import load_shared as _load_shared
+
+    return _load_shared(csv_path)
+
+
+def score(df):
+    """Add the derived scoring columns to a raw data.csv-schema frame."""
+    from scoring import score_dataframe
+
+    return score_dataframe(df)
+
+
+def score_file(path):
+    """Read any supported input file, validate and score it (no cache).
+
+    Raises validation.ValidationError when the file breaks a data-quality rule.
+    """
+    from validation import check
+
+    df = read_table(path)
+    check(df, path)
+    return score(df)
+
+
+def filter_communes(df, search="", region=None, priorities=(), min_population=0,
+                    min_revenue=0, min_score=0, sort_by="revenuAnnuel", ascending=False):
+    """Rows of `df` matching the sidebar-style criteria, sorted by `sort_by`."""
+    from filters import FilterIndex, FilterState
+
+    state = FilterState(
+        search=search,
+        region=region,
+        priorities=tuple(priorities),
+        min_population=min_population,
+        min_revenue=min_revenue,
+        min_score=min_score,
+    )
+    return df.iloc[FilterIndex(df).sorted_rows(state, sort_by, ascending)]
+
+
+# --- Agrégations du tableau de bord --------------------------------------------
+
+def overview(df):
+    """The five headline metrics of the dashboard."""
+    return {
+        "villes": len(df),
+        "revenuMoyen": float(df["revenuAnnuel"].mean()) if len(df) > 0 else 0.0,
+        "revenuTotal": int(df["revenuAnnuel"].sum()),
+        "villesPrioriteA": int((df["priorite"] == "A").sum()),
+        "clientsTotaux": int(df["clientsPotentiels"].sum()),
+    }
+
+
+def top_revenue(df, n=20):
+    return df.nlargest(n, "revenuAnnuel")[["nom", "revenuAnnuel", "clientsPotentiels", "priorite"]].reset_index(drop=True)
+
+
+def priority_counts(df):
+    counts = df["priorite"].value_counts().loc[lambda s: s > 0].reset_index()
+    counts.columns = ["Priorité", "Nombre"]
+    return counts
+
+
+def priority_revenue(df):
+    revenue = df.groupby("priorite", observed=True)["revenuAnnuel"].sum().reset_index()
+    revenue.columns = ["Priorité", "Revenu Total (€)"]
+    return revenue
+
+
+def region_stats(df):
+    stats = df.groupby("region", observed=True).agg({
+        "revenuAnnuel": "sum",
+        "clientsPotentiels": "sum",
+        "nom": "count",
+    }).reset_index()
+    stats.columns = ["Région", "Revenu Total", "Clients Totaux", "Nb Villes"]
+    return stats.sort_values("Revenu Total", ascending=False)
+
+
+# --- CLI -------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a communes table and write the result.")
+    parser.add_argument("input", nargs="?", default=str(DATA_PATH), help="CSV, Parquet or Feather file (default: data.csv)")
+    parser.add_argument("-o", "--output", help="output file (.csv, .parquet, .feather or .xlsx); default: <input>-scored.csv")
+    parser.add_argument("--search", default="")
+    parser.add_argument("--region")
+    parser.add_argument("--priorite", nargs="*", default=[])
+    parser.add_argument("--min-population", type=float, default=0)
+    parser.add_argument("--min-revenue", type=float, default=0)
+    parser.add_argument("--min-score", type=float, default=0)
+    parser.add_argument("--sort", choices=SORT_COLUMNS, default="revenuAnnuel")
+    parser.add_argument("--ascending", action="store_true")
+    args = parser.parse_args(argv)
+
+    src = Path(args.input)
+    out = Path(args.output) if args.output else src.with_name(f"{src.stem}-scored.csv")
+    from validation import ValidationError, summary
+
+    try:
+        df = score_file(src)
+    except ValidationError as e:
+        print(summary(e.report))
+        print(f"ERROR: {src} failed validation, nothing written")
+        return 2
+    df = filter_communes(
+        df,
+        search=args.search,
+        region=args.region,
+        priorities=args.priorite,
+        min_population=args.min_population,
+        min_revenue=args.min_revenue,
+        min_score=args.min_score,
+        sort_by=args.sort,
+        ascending=args.ascending,
+    )
+    write_table(df, out)
+    print(f"Saved {len(df)} scored communes to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""scenarios.py
+Sensitivity sweep over scoring weights, price and penetration rates.
+
+The five sub-scores of every commune form an (n × 5) matrix computed once;
+the bonuses/penalties do not depend on the weights. A chunk of scenarios is
+then scored with a single matrix product against a (5 × chunk) weight
+matrix. Clients, revenue and priority class follow from each scenario's
+penetration rates and price. Ranks (by score, ties share the best rank) are
+counted with one bincount per chunk instead of a sort per scenario.
+
+Per-commune stability statistics are accumulated chunk by chunk, optionally
+on a process pool, so memory stays bounded whatever the number of scenarios:
+
+    python scenarios.py -n 5000 --workers 4 -o stabilite.csv
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import scoring
+from scoring import CAPS, PRIORITIES, WEIGHTS
+
+CRITERIA = list(WEIGHTS)
+WEIGHT_COLUMNS = [f"poids_{c}" for c in CRITERIA]
+SCORE_LEVELS = 101
+
+
+def base_scenario():
+    """The scenario used by the dashboard (current constants of scoring.py)."""
+    row = {f"poids_{c}": w for c, w in WEIGHTS.items()}
+    row.update(
+        prix_mensuel=scoring.PRIX_MENSUEL,
+        taux_large=scoring.TAUX_PENETRATION_LARGE,
+        taux_petite=scoring.TAUX_PENETRATION_PETITE,
+    )
+    return pd.DataFrame([row])
+
+
+def random_scenarios(m, seed=0, concentration=50.0, prix=(12, 18), taux_large=(0.12, 0.18), taux_petite=(0.08, 0.12)):
+    """`m` seeded scenarios: Dirichlet weights around the base weights, uniform price/penetration."""
+    rng = np.random.default_rng(seed)
+    base = np.array([WEIGHTS[c] for c in CRITERIA])
+    weights = rng.dirichlet(base / base.sum() * concentration, size=m) * base.sum()
+    scenarios = pd.DataFrame(weights, columns=WEIGHT_COLUMNS)
+    scenarios["prix_mensuel"] = rng.uniform(*prix, size=m)
+    scenarios["taux_large"] = rng.uniform(*taux_large, size=m)
+    scenarios["taux_petite"] = rng.uniform(*taux_petite, size=m)
+    return scenarios
+
+
+def criteria_matrix(df):
+    """(sub-scores (n × 5), bonus/penalty adjustments (n,)) as in scoring.compute_score."""
+    subs = np.column_stack([
+        np.minimum((df[c].to_numpy() / CAPS[c]) * 100, 100) for c in CRITERIA
+    ])
+    adjust = scoring.adjustment_points(df).astype(np.float64)
+    return subs, adjust
+
+
+def _inputs(df):
+    subs, adjust = criteria_matrix(df)
+    foyers, _, _ = scoring.compute_foyers(df)
+    large = df["zoneChalandise"].to_numpy() >= scoring.SEUIL_ZONE_CHALANDISE
+    return subs, adjust, foyers.astype(np.float64), large
+
+
+def evaluate_chunk(inputs, scenarios):
+    """Score, clients, revenue and priority code, each shaped (n, len(scenarios))."""
+    subs, adjust, foyers, large = inputs
+    weights = scenarios[WEIGHT_COLUMNS].to_numpy(dtype=np.float64).T
+    score = np.rint(np.clip(subs @ weights + adjust[:, None], 0, 100)).astype(np.int64)
+    taux = np.where(large[:, None], scenarios["taux_large"].to_numpy()[None, :], scenarios["taux_petite"].to_numpy()[None, :])
+    clients = np.rint(foyers[:, None] * taux)
+    revenue = clients * scenarios["prix_mensuel"].to_numpy()[None, :] * 12
+    priority = np.select(
+        [(score >= 75) & (revenue >= 50000), (score >= 60) & (revenue >= 30000), score >= 45],
+        [0, 1, 2],
+        3,
+    ).astype(np.uint8)
+    return score, clients, revenue, priority
+
+
+def score_ranks(score):
+    """Rank of each commune by score within each column (1 = best, ties share the best rank)."""
+    n, m = score.shape
+    keys = score + SCORE_LEVELS * np.arange(m)[None, :]
+    hist = np.bincount(keys.ravel(), minlength=SCORE_LEVELS * m).reshape(m, SCORE_LEVELS)
+    better = np.cumsum(hist[:, ::-1], axis=1)[:, ::-1] - hist  # communes strictement meilleures
+    return better[np.arange(m)[None, :], score] + 1
+
+
+def _accumulate(inputs, scenarios):
+    score, _, _, priority = evaluate_chunk(inputs, scenarios)
+    ranks = score_ranks(score).astype(np.float64)
+    n = score.shape[0]
+    counts = np.zeros((n, len(PRIORITIES)), dtype=np.int64)
+    for code in range(len(PRIORITIES)):
+        counts[:, code] = (priority == code).sum(axis=1)
+    return {
+        "counts": counts,
+        "rank_sum": ranks.sum(axis=1),
+        "rank_sq": (ranks ** 2).sum(axis=1),
+        "rank_min": ranks.min(axis=1),
+        "rank_max": ranks.max(axis=1),
+    }
+
+
+_WORKER_INPUTS = None
+
+
+def _init_worker(inputs):
+    global _WORKER_INPUTS
+    _WORKER_INPUTS = inputs
+
+
+def _worker(scenarios):
+    return _accumulate(_WORKER_INPUTS, scenarios)
+
+
+def sweep(df, scenarios, chunk_size=64, workers=None):
+    """Per-commune stability of priority class and score rank across `scenarios`."""
+    inputs = _inputs(df)
+    n, m = len(df), len(scenarios)
+    chunks = [scenarios.iloc[i:i + chunk_size] for i in range(0, m, chunk_size)]
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+            parts = pool.map(_worker, chunks)
+            totals = _reduce(parts, n)
+    else:
+        totals = _reduce((_accumulate(inputs, c) for c in chunks), n)
+
+    counts = totals["counts"]
+    mean = totals["rank_sum"] / max(m, 1)
+    std = np.sqrt(np.maximum(totals["rank_sq"] / max(m, 1) - mean ** 2, 0))
+    base_rank = score_ranks(df["score"].to_numpy()[:, None])[:, 0]
+
+    out = pd.DataFrame({
+        "nom": df["nom"].to_numpy(),
+        "departement": df["departement"].to_numpy(),
+        "prioriteBase": df["priorite"].astype(str).to_numpy(),
+    })
+    for code, p in enumerate(PRIORITIES):
+        out[f"part{p}"] = counts[:, code] / max(m, 1)
+    out["prioriteModale"] = np.asarray(PRIORITIES)[counts.argmax(axis=1)]
+    out["stabilitePriorite"] = counts.max(axis=1) / max(m, 1)
+    out["rangBase"] = base_rank
+    out["rangMoyen"] = mean
+    out["rangEcartType"] = std
+    out["rangMin"] = totals["rank_min"].astype(np.int64)
+    out["rangMax"] = totals["rank_max"].astype(np.int64)
+    return out
+
+
+def _reduce(parts, n):
+    totals = {
+        "counts": np.zeros((n, len(PRIORITIES)), dtype=np.int64),
+        "rank_sum": np.zeros(n),
+        "rank_sq": np.zeros(n),
+        "rank_min": np.full(n, np.inf),
+        "rank_max": np.zeros(n),
+    }
+    for part in parts:
+        totals["counts"] += part["counts"]
+        totals["rank_sum"] += part["rank_sum"]
+        totals["rank_sq"] += part["rank_sq"]
+        totals["rank_min"] = np.minimum(totals["rank_min"], part["rank_min"])
+        totals["rank_max"] = np.maximum(totals["rank_max"], part["rank_max"])
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sensitivity sweep over scoring weights and pricing.")
+    parser.add_argument("-n", "--scenarios", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("-o", "--output", default="stabilite_scenarios.csv")
+    args = parser.parse_args(argv)
+
+    import pipeline
+
+    df = pipeline.load_data()
+    result = sweep(df, random_scenarios(args.scenarios, seed=args.seed), args.chunk_size, args.workers)
+    pipeline.write_table(result, args.output)
+    unstable = (result["stabilitePriorite"] < 0.9).sum()
+    print(f"Saved stability of {len(result)} communes over {args.scenarios} scenarios to {args.output} "
+          f"({unstable} change priority in more than 10% of scenarios)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""scoring.py
+Scoring engine for the communes table (data.csv schema).
+
+`score_dataframe()` computes every derived column (score, foyers, clients,
+revenue, priority, saturation) column-wise with NumPy. The original row
+functions are kept below as the reference implementation; `check_app.py`
+verifies both give identical results on the full dataset.
+"""
+import numpy as np
+import pandas as pd
+
+# Pondérations (périphéries > centres-villes)
+WEIGHTS = {
+    "pct_maison": 0.40,
+    "tauxProprietaires": 0.25,
+    "plus60ans": 0.15,
+    "revenuMedian": 0.10,
+    "pct_30_44": 0.10,
+}
+
+# Valeur donnant 100 points pour chaque critère
+CAPS = {
+    "pct_maison": 90,
+    "tauxProprietaires": 70,
+    "plus60ans": 35,
+    "revenuMedian": 27000,
+    "pct_30_44": 25,
+}
+
+# Paliers (seuil strict, points), du plus haut au plus bas
+BONUS_PERIPHERIE = ((80, 15), (70, 10), (60, 5))
+PENALITE_CENTRE = ((70, -20), (60, -15), (50, -10))
+PENALITE_GRANDE_VILLE = ((100000, -10), (50000, -5))
+
+PERSONNES_PAR_FOYER = 2.2
+SEUIL_ZONE_CHALANDISE = 300
+TAUX_PENETRATION_LARGE = 0.15
+TAUX_PENETRATION_PETITE = 0.10
+PRIX_MENSUEL = 15
+
+PRIORITIES = ["A", "B", "C", "D"]
+SATURATION_LABELS = ["🟢 Fort Potentiel", "🟡 Potentiel Moyen", "🔴 Faible Potentiel"]
+
+SCORED_COLUMNS = [
+    "score", "foyersPotentiels", "clientsPotentiels", "personnes60plus",
+    "revenuAnnuel", "priorite", "saturation",
+]
+
+# Détail du score : points pondérés par critère, puis bonus/pénalités
+COMPONENT_COLUMNS = {
+    "pct_maison": "pointsMaisons",
+    "tauxProprietaires": "pointsProprietaires",
+    "plus60ans": "pointsPlus60ans",
+    "revenuMedian": "pointsRevenu",
+    "pct_30_44": "pointsFamilles",
+}
+ADJUSTMENT_COLUMNS = ["bonusPeripherie", "penaliteCentre", "penaliteGrandeVille"]
+# Colonne source et paliers de chaque bonus/pénalité, dans l'ordre de ADJUSTMENT_COLUMNS
+ADJUSTMENTS = (
+    ("pct_maison", BONUS_PERIPHERIE),
+    ("pct_appartement", PENALITE_CENTRE),
+    ("population", PENALITE_GRANDE_VILLE),
+)
+
+
+def scoring_params():
+    """All scoring constants, as a JSON-serialisable dict (used for cache keys)."""
+    return {
+        "weights": WEIGHTS,
+        "caps": CAPS,
+        "bonus_peripherie": BONUS_PERIPHERIE,
+        "penalite_centre": PENALITE_CENTRE,
+        "penalite_grande_ville": PENALITE_GRANDE_VILLE,
+        "personnes_par_foyer": PERSONNES_PAR_FOYER,
+        "seuil_zone_chalandise": SEUIL_ZONE_CHALANDISE,
+        "taux_penetration": [TAUX_PENETRATION_LARGE, TAUX_PENETRATION_PETITE],
+        "prix_mensuel": PRIX_MENSUEL,
+        "priorities": PRIORITIES,
+        "saturation_labels": SATURATION_LABELS,
+    }
+
+
+def _tiers(values, tiers):
+    """Points of the first tier whose threshold is strictly exceeded, else 0."""
+    return np.select([values > seuil for seuil, _ in tiers], [pts for _, pts in tiers], 0)
+
+
+def adjustment_points(df):
+    """Total bonus/penalty points of each row (int64), summed over ADJUSTMENTS."""
+    total = np.zeros(len(df), dtype=np.int64)
+    for col, tiers in ADJUSTMENTS:
+        total += _tiers(df[col].to_numpy(), tiers)
+    return total
+
+
+def compute_score(df):
+    """Score pondéré 0-100 (int64), identique à calculate_score()."""
+    score_base = 0.0
+    for col, poids in WEIGHTS.items():
+        sub = np.minimum((df[col].to_numpy() / CAPS[col]) * 100, 100)
+        score_base = score_base + sub * poids
+
+    score_total = score_base + adjustment_points(df)
+    return np.rint(np.clip(score_total, 0, 100)).astype(np.int64)
+
+
+def score_components(df):
+    """Points contributed by each criterion and each bonus/penalty (before clipping and rounding)."""
+    out = {
+        COMPONENT_COLUMNS[col]: np.minimum((np.asarray(df[col], dtype=np.float64) / CAPS[col]) * 100, 100) * poids
+        for col, poids in WEIGHTS.items()
+    }
+    for name, (col, tiers) in zip(ADJUSTMENT_COLUMNS, ADJUSTMENTS):
+        out[name] = _tiers(df[col].to_numpy(), tiers)
+    return pd.DataFrame(out, index=df.index)
+
+
+def compute_foyers(df):
+    """Return (foyersPotentiels, clientsPotentiels, personnes60plus) as int64 arrays."""
+    personnes = np.rint(df["population"].to_numpy() * df["plus60ans"].to_numpy() / 100)
+    foyers = np.rint(personnes / PERSONNES_PAR_FOYER)
+    taux = np.where(
+        df["zoneChalandise"].to_numpy() >= SEUIL_ZONE_CHALANDISE,
+        TAUX_PENETRATION_LARGE,
+        TAUX_PENETRATION_PETITE,
+    )
+    clients = np.rint(foyers * taux)
+    return foyers.astype(np.int64), clients.astype(np.int64), personnes.astype(np.int64)
+
+
+def compute_revenue(clients):
+    """Revenu annuel estimé (€) à partir du nombre de clients."""
+    return np.asarray(clients) * PRIX_MENSUEL * 12
+
+
+def compute_priority(score, revenue):
+    """Niveau de priorité A-D sous forme de Categorical."""
+    score = np.asarray(score)
+    revenue = np.asarray(revenue)
+    codes = np.select(
+        [(score >= 75) & (revenue >= 50000), (score >= 60) & (revenue >= 30000), score >= 45],
+        [0, 1, 2],
+        3,
+    )
+    return pd.Categorical.from_codes(codes, categories=PRIORITIES, ordered=True)
+
+
+def compute_saturation(clients, population):
+    """Indicateur de saturation marché sous forme de Categorical."""
+    clients = np.asarray(clients, dtype=np.float64)
+    population = np.asarray(population)
+    ratio = np.divide(clients, population, out=np.zeros_like(clients), where=population > 0)
+    codes = np.select([ratio > 0.05, ratio > 0.03], [0, 1], 2)
+    return pd.Categorical.from_codes(codes, categories=SATURATION_LABELS)
+
+
+def score_dataframe(df):
+    """Return a copy of `df` with all derived scoring columns added."""
+    score = compute_score(df)
+    foyers, clients, personnes = compute_foyers(df)
+    revenue = compute_revenue(clients)
+    return df.assign(
+        score=score,
+        foyersPotentiels=foyers,
+        clientsPotentiels=clients,
+        personnes60plus=personnes,
+        revenuAnnuel=revenue,
+        priorite=compute_priority(score, revenue),
+        saturation=compute_saturation(clients, df["population"].to_numpy()),
+    )
+
+
+# --- Implémentation de référence (ligne par ligne) ---------------------------
+
+def calculate_score(row):
+    """Calcul du score pondéré adapté au nettoyage de poubelles - favorise les périphéries"""
+
+    # Pondérations adaptées (périphéries > centres-villes)
+    poids_maisons = 0.40        # AUGMENTÉ - Critère principal pour périphéries
+    poids_proprio = 0.25        # Stabilité clientèle
+    poids_pop60 = 0.15          # RÉDUIT - Moins critique que le type d'habitat
+    poids_revenu = 0.10         # Pouvoir d'achat
+    poids_familles = 0.10       # AUGMENTÉ - Familles en périphérie
+    # Population totale supprimée - favorise petites villes périphériques
+
+    # Calcul des scores individuels
+    score_maisons = min((row['pct_maison'] / 90) * 100, 100)
+    score_proprio = min((row['tauxProprietaires'] / 70) * 100, 100)
+    score_pop60 = min((row['plus60ans'] / 35) * 100, 100)
+    score_revenu = min((row['revenuMedian'] / 27000) * 100, 100)
+    score_familles = min((row['pct_30_44'] / 25) * 100, 100)
+
+    # BONUS PÉRIPHÉRIE : Favorise zones pavillonnaires (>70% maisons)
+    bonus_peripherie = 0
+    if row['pct_maison'] > 80:
+        bonus_peripherie = 15  # Bonus important pour zones très pavillonnaires
+    elif row['pct_maison'] > 70:
+        bonus_peripherie = 10  # Bonus moyen
+    elif row['pct_maison'] > 60:
+        bonus_peripherie = 5   # Petit bonus
+
+    # PÉNALITÉ CENTRE-VILLE : Pénalise zones denses (>60% appartements)
+    penalite_centre = 0
+    if row['pct_appartement'] > 70:
+        penalite_centre = -20  # Forte pénalité pour centres très denses
+    elif row['pct_appartement'] > 60:
+        penalite_centre = -15  # Pénalité moyenne
+    elif row['pct_appartement'] > 50:
+        penalite_centre = -10  # Petite pénalité
+
+    # PÉNALITÉ GRANDE VILLE : Les très grandes villes = centres denses
+    penalite_grande_ville = 0
+    if row['population'] > 100000:
+        penalite_grande_ville = -10  # Grandes villes = centres denses
+    elif row['population'] > 50000:
+        penalite_grande_ville = -5   # Villes moyennes
+
+    # Score total pondéré avec bonus/pénalités
+    score_base = (
+        score_maisons * poids_maisons +
+        score_proprio * poids_proprio +
+        score_pop60 * poids_pop60 +
+        score_revenu * poids_revenu +
+        score_familles * poids_familles
+    )
+
+    score_total = score_base + bonus_peripherie + penalite_centre + penalite_grande_ville
+
+    # Limiter entre 0 et 100
+    score_total = max(0, min(100, score_total))
+
+    return round(score_total)
+
+
+def calculate_foyers(row):
+    """Calcul des foyers et clients potentiels"""
+    nb_personnes_60plus = round((row['population'] * row['plus60ans']) / 100)
+    foyers_potentiels = round(nb_personnes_60plus / 2.2)
+    taux_penetration = 0.15 if row['zoneChalandise'] >= 300 else 0.10
+    clients_potentiels = round(foyers_potentiels * taux_penetration)
+
+    return pd.Series({
+        'foyersPotentiels': foyers_potentiels,
+        'clientsPotentiels': clients_potentiels,
+        'personnes60plus': nb_personnes_60plus
+    })
+
+
+def calculate_revenue(row):
+    """Calcul du revenu annuel estimé"""
+    prix_mensuel = 15  # €/mois par client
+    revenu_annuel = row['clientsPotentiels'] * prix_mensuel * 12
+    return revenu_annuel
+
+
+def get_priority_level(score, revenue):
+    """Détermination du niveau de priorité"""
+    if score >= 75 and revenue >= 50000:
+        return "A"
+    elif score >= 60 and revenue >= 30000:
+        return "B"
+    elif score >= 45:
+        return "C"
+    else:
+        return "D"
+
+
+def get_saturation(row):
+    """Indicateur de saturation marché"""
+    ratio = row['clientsPotentiels'] / row['population'] if row['population'] > 0 else 0
+    if ratio > 0.05:
+        return "🟢 Fort Potentiel"
+    elif ratio > 0.03:
+        return "🟡 Potentiel Moyen"
+    else:
+        return "🔴 Faible Potentiel"
+
+
+def score_dataframe_rowwise(df):
+    """Reference (slow) scoring using the row functions, as App.py used to."""
+    df = df.copy()
+    df['score'] = df.apply(calculate_score, axis=1)
+    df[['foyersPotentiels', 'clientsPotentiels', 'personnes60plus']] = df.apply(calculate_foyers, axis=1)
+    df['revenuAnnuel'] = df.apply(calculate_revenue, axis=1)
+    df['priorite'] = df.apply(lambda row: get_priority_level(row['score'], row['revenuAnnuel']), axis=1)
+    df['saturation'] = df.apply(get_saturation, axis=1)
+    return df
@@ -0,0 +1,164 @@
+"""search.py
+Accent-insensitive search index over commune names and codes.
+
+Names are folded once at load time (accents removed, case, hyphens and
+apostrophes turned into spaces). Queries are answered from:
+- a sorted token array (word-prefix lookups with searchsorted),
+- trigram postings (substring lookups, verified on the folded name),
+- exact department-code and INSEE-code lookups.
+Results are ranked: exact name, name prefix, word prefix, substring; ties
+are broken by population when available.
+"""
+import re
+import unicodedata
+
+import numpy as np
+
+_SEPARATORS = re.compile(r"[\s\-'’`_.,/()]+")
+
+
+def fold(text):
+    """Lowercase, strip accents and turn hyphens/apostrophes into single spaces."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", text.lower()).strip()
+
+
+def normalize_departement(code):
+    """'1' -> '01', '2a' -> '2A'; other values are returned upper-cased."""
+    code = str(code).strip().upper()
+    if code.isdigit() and len(code) == 1:
+        return "0" + code
+    return code
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _looks_like_code(query):
+    return bool(re.fullmatch(r"\d{1,3}|2[abAB]|\d[\dabAB]\d{3}", query))
+
+
+# Rangs (plus petit = plus pertinent)
+RANK_EXACT, RANK_PREFIX, RANK_WORD, RANK_SUBSTRING, RANK_DEPARTEMENT = range(5)
+
+
+class SearchIndex:
+    def __init__(self, names, departements=None, codes=None, weights=None):
+        self.folded = [fold(n) for n in names]
+        self.n = len(self.folded)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+        # Postings trigrammes et tokens triés
+        postings = {}
+        tokens, token_rows = [], []
+        for row, name in enumerate(self.folded):
+            for tri in _trigrams(name):
+                postings.setdefault(tri, []).append(row)
+            for tok in set(name.split()):
+                tokens.append(tok)
+                token_rows.append(row)
+        self._trigrams = {k: np.asarray(v, dtype=np.int32) for k, v in postings.items()}
+        tokens = np.asarray(tokens, dtype=str)
+        order = np.argsort(tokens, kind="stable")
+        self._tokens = tokens[order]
+        self._token_rows = np.asarray(token_rows, dtype=np.int32)[order]
+
+        self._departements = self._group(departements, normalize_departement)
+        self._codes = self._group(codes, lambda c: str(c).strip().upper())
+
+    @staticmethod
+    def _group(values, key):
+        if values is None:
+            return {}
+        groups = {}
+        for row, value in enumerate(values):
+            groups.setdefault(key(value), []).append(row)
+        return {k: np.asarray(v, dtype=np.int32) for k, v in groups.items()}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Index a data.csv-style (nom/departement[/codeInsee]) or cities_insee-style (code/codeDepartement) frame."""
+        dep_col = "departement" if "departement" in df.columns else "codeDepartement"
+        code_col = "codeInsee" if "codeInsee" in df.columns else "code"
+        return cls(
+            df["nom"].tolist(),
+            departements=df[dep_col].tolist() if dep_col in df.columns else None,
+            codes=df[code_col].tolist() if code_col in df.columns else None,
+            weights=df["population"].to_numpy() if "population" in df.columns else None,
+        )
+
+    # --- Recherche par nom -------------------------------------------------
+
+    def _word_prefix(self, query):
+        lo = np.searchsorted(self._tokens, query, side="left")
+        hi = np.searchsorted(self._tokens, query + "\U0010ffff", side="left")
+        return np.unique(self._token_rows[lo:hi])
+
+    def _substring(self, query):
+        grams = _trigrams(query)
+        lists = []
+        for g in grams:
+            rows = self._trigrams.get(g)
+            if rows is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(rows)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return np.asarray([r for r in candidates if query in self.folded[r]], dtype=np.int32)
+
+    def _name_matches(self, query):
+        if " " not in query and len(query) < 4:
+            # Requêtes courtes : début de mot uniquement (évite des milliers de sous-chaînes)
+            return self._word_prefix(query)
+        return self._substring(query)
+
+    # --- API ---------------------------------------------------------------
+
+    def _lookup(self, query):
+        """(folded query, name matches, INSEE-code matches, department matches)."""
+        raw = str(query).strip()
+        folded = fold(raw)
+        empty = np.empty(0, dtype=np.int32)
+        if not folded:
+            return folded, empty, empty, empty
+        codes = deps = empty
+        if _looks_like_code(raw):
+            codes = self._codes.get(raw.upper(), empty)
+            deps = self._departements.get(normalize_departement(raw), empty)
+        return folded, self._name_matches(folded), codes, deps
+
+    def matches(self, query):
+        """Row positions (ascending) matching `query` by name, department or INSEE code."""
+        _, names, codes, deps = self._lookup(query)
+        return np.union1d(np.union1d(names, codes), deps).astype(np.int64)
+
+    def search(self, query, limit=None):
+        """Row positions matching `query`, most relevant first."""
+        folded, names, codes, deps = self._lookup(query)
+        found = {}
+        for r in deps.tolist():
+            found[r] = RANK_DEPARTEMENT
+        for r in names.tolist():
+            name = self.folded[r]
+            if name == folded:
+                found[r] = RANK_EXACT
+            elif name.startswith(folded):
+                found[r] = RANK_PREFIX
+            elif (" " + folded) in (" " + name):
+                found[r] = RANK_WORD
+            else:
+                found[r] = RANK_SUBSTRING
+        for r in codes.tolist():
+            found[r] = RANK_EXACT
+
+        rows = np.fromiter(found.keys(), dtype=np.int64, count=len(found))
+        ranks = np.fromiter(found.values(), dtype=np.int64, count=len(found))
+        weights = self.weights[rows] if self.weights is not None else np.zeros(len(rows))
+        rows = rows[np.lexsort((rows, -weights, ranks))]
+        return rows if limit is None else rows[:limit]
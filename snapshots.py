@@ -0,0 +1,346 @@
+"""snapshots.py
+Versioned snapshots of the scored communes table, incremental refresh and diffs.
+
+Every refresh of data.csv (or of cities_insee.csv, e.g. a new population
+vintage) is stored as a numbered, zstd-compressed Feather snapshot with the
+compact schema of dataset_cache.COMPACT_DTYPES, listed in
+snapshots/<source>/manifest.json with the digests it was built from.
+
+A commune is identified by its departement, its name and its rank among the
+rows sharing both (cleCommune), and each row carries a 64-bit hash of its
+source columns (empreinte). A refresh hashes the new source, joins it to the
+latest snapshot on cleCommune (hash index, linear time) and only scores the
+rows that are new or whose hash changed. INSEE matching is redone for those
+rows only, unless the join columns of cities_insee.csv changed; INSEE
+populations are always looked up again by code. New scoring parameters
+rescore every row but keep the INSEE matches. The table is the same as a
+full rebuild (dataset_cache.build), and is also written as the dashboard's
+cached artifact.
+
+The diff between two snapshots uses the same join: new and removed
+communes, priority class changes and revenue changes. Only the changed rows
+are sorted.
+
+    python snapshots.py [data.csv] [-o changements.csv]
+    python snapshots.py --list
+    python snapshots.py --diff 3 4 -o changements.xlsx
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import CSV_PATH, compact, read_source, write_artifact
+from enrich import INSEE_COLUMNS, INSEE_PATH, enrich, read_insee
+from scoring import PRIORITIES, SCORED_COLUMNS, score_dataframe, scoring_params
+from validation import check as check_source
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+MANIFEST = "manifest.json"
+KEY_COLUMN = "cleCommune"
+HASH_COLUMN = "empreinte"
+# Colonnes de cities_insee.csv dont dépend l'appariement (la population est relue par code)
+INSEE_JOIN_COLUMNS = ["code", "nom", "codeDepartement", "codeRegion", "lat", "lon"]
+CHANGE_LABELS = ["nouvelle", "supprimée", "priorité", "revenu"]
+
+
+def snapshot_dir(csv_path=CSV_PATH):
+    return SNAPSHOT_DIR / Path(csv_path).stem
+
+
+def commune_keys(df):
+    """64-bit identity of each row: departement, name and rank among the rows sharing both."""
+    ident = pd.DataFrame({
+        "departement": df["departement"].astype(str).to_numpy(),
+        "nom": df["nom"].astype(str).to_numpy(),
+    })
+    ident["rang"] = ident.groupby(["departement", "nom"], sort=False).cumcount()
+    return pd.util.hash_pandas_object(ident, index=False).to_numpy()
+
+
+def input_columns(df):
+    """Source columns of `df`: everything the scoring and INSEE enrichment do not produce."""
+    derived = set(SCORED_COLUMNS) | set(INSEE_COLUMNS) | {KEY_COLUMN, HASH_COLUMN}
+    return [c for c in df.columns if c not in derived]
+
+
+def row_hashes(df, columns):
+    """64-bit hash of each row of `df[columns]`."""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.tobytes() if isinstance(part, np.ndarray) else json.dumps(part, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def list_snapshots(directory):
+    """Manifest entries of the snapshots stored in `directory`, oldest first."""
+    path = Path(directory) / MANIFEST
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_snapshot(directory, version=None):
+    """(snapshot frame, manifest entry) of `version`, the latest one when None."""
+    entries = list_snapshots(directory)
+    if version is None and entries:
+        entry = entries[-1]
+    else:
+        entry = next((e for e in entries if e["version"] == version), None)
+    if entry is None:
+        raise ValueError(f"no snapshot {'' if version is None else f'v{version} '}in {directory}")
+    return pd.read_feather(Path(directory) / entry["file"]), entry
+
+
+def save_snapshot(table, keys, hashes, info, directory):
+    """Store `table` with its row keys and hashes as the next version; returns its manifest entry."""
+    directory = Path(directory)
+    entries = list_snapshots(directory)
+    version = entries[-1]["version"] + 1 if entries else 1
+    entry = {"version": version, "file": f"v{version:04d}.feather", **info}
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / entry["file"]
+    tmp = target.with_suffix(".tmp")
+    table.assign(**{KEY_COLUMN: keys, HASH_COLUMN: hashes}).to_feather(tmp, compression="zstd")
+    os.replace(tmp, target)
+    manifest = directory / MANIFEST
+    tmp = manifest.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entries + [entry], indent=1, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, manifest)
+    return entry
+
+
+def _assemble(kept, kept_rows, fresh, fresh_rows):
+    """Rows of `kept` and `fresh` put back at their positions `kept_rows` and `fresh_rows`."""
+    position = np.empty(len(kept_rows) + len(fresh_rows), dtype=np.int64)
+    position[np.concatenate([kept_rows, fresh_rows])] = np.arange(len(position))
+    both = pd.concat([kept.reset_index(drop=True), fresh.reset_index(drop=True)], ignore_index=True)
+    return both.iloc[position].reset_index(drop=True)
+
+
+def _insee_population(codes, insee):
+    pos = pd.Index(insee["code"]).get_indexer(np.asarray(codes, dtype=object))
+    population = insee["population"].to_numpy(dtype=np.float64)[np.maximum(pos, 0)]
+    return pd.array(np.where(pos >= 0, population, np.nan), dtype="Int64")
+
+
+def incremental_score(raw, previous, position, rescore, rematch, insee=None):
+    """Scored (and INSEE-enriched) `raw`, reusing the derived columns of snapshot `previous`.
+
+    `position` gives the row of `previous` holding each row of `raw` (-1 for
+    new communes). Only new rows and those flagged in `rescore` are scored,
+    only new rows and those flagged in `rematch` are matched to `insee`.
+    """
+
+    def derived(columns, flagged, compute):
+        flagged = flagged | (position < 0)
+        fresh_rows, kept_rows = np.flatnonzero(flagged), np.flatnonzero(~flagged)
+        if len(fresh_rows) == 0:
+            # Rien à recalculer : ni score ni clés INSEE (coûteuses sur tout le référentiel)
+            return previous.iloc[position][columns].reset_index(drop=True)
+        fresh = compute(raw.iloc[fresh_rows])[columns]
+        kept = previous.iloc[position[kept_rows]][columns] if len(kept_rows) else fresh.iloc[:0]
+        return _assemble(kept, kept_rows, fresh, fresh_rows)
+
+    raw = raw.reset_index(drop=True)
+    parts = derived(SCORED_COLUMNS, rescore, score_dataframe)
+    out = raw.assign(**{c: parts[c] for c in SCORED_COLUMNS})
+    if insee is not None:
+        parts = derived(INSEE_COLUMNS, rematch, lambda rows: enrich(rows, insee))
+        parts["populationInsee"] = _insee_population(parts["codeInsee"], insee)
+        out = out.assign(**{c: parts[c] for c in INSEE_COLUMNS})
+    return compact(out)
+
+
+def refresh(csv_path=CSV_PATH, directory=None, insee_path=INSEE_PATH, write_cache=True):
+    """Score `csv_path` from the latest snapshot and store a new version if anything changed.
+
+    Returns (scored table, manifest entry, changes since the previous
+    version); changes is None when nothing changed and no version was added.
+    Raises validation.ValidationError when the CSV breaks a data-quality rule.
+    """
+    start = time.perf_counter()
+    directory = Path(directory) if directory else snapshot_dir(csv_path)
+    raw = read_source(csv_path)
+    check_source(raw, csv_path)
+    columns = input_columns(raw)
+    keys = commune_keys(raw)
+    hashes = row_hashes(raw, columns)
+    insee = read_insee(insee_path) if Path(insee_path).exists() else None
+    if insee is not None:
+        join_hashes = row_hashes(insee, INSEE_JOIN_COLUMNS)
+        population_hashes = row_hashes(insee, ["population"])
+    info = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "source": Path(csv_path).name,
+        "rows": len(raw),
+        "columns": columns,
+        "source_digest": _digest(columns, keys, hashes),
+        "insee_digest": None if insee is None else _digest(join_hashes, population_hashes),
+        "insee_join_digest": None if insee is None else _digest(join_hashes),
+        "params_digest": _digest(scoring_params()),
+    }
+
+    previous = None
+    position = np.full(len(raw), -1, dtype=np.int64)
+    same = np.zeros(len(raw), dtype=bool)
+    if list_snapshots(directory):
+        previous, last = load_snapshot(directory)
+        digests = ("source_digest", "insee_digest", "params_digest")
+        if all(info[k] == last[k] for k in digests):
+            return previous.drop(columns=[KEY_COLUMN, HASH_COLUMN]), last, None
+        # Schéma source différent : rien n'est repris, le snapshot précédent ne sert qu'au diff
+        if last["columns"] == columns:
+            position = pd.Index(previous[KEY_COLUMN]).get_indexer(keys)
+            found = position >= 0
+            same[found] = previous[HASH_COLUMN].to_numpy()[position[found]] == hashes[found]
+        rescore = ~same if info["params_digest"] == last["params_digest"] else np.ones(len(raw), dtype=bool)
+        rematch = ~same if info["insee_join_digest"] == last["insee_join_digest"] else np.ones(len(raw), dtype=bool)
+    else:
+        rescore = rematch = np.ones(len(raw), dtype=bool)
+
+    table = incremental_score(raw, previous, position, rescore, rematch, insee)
+    current = table.assign(**{KEY_COLUMN: keys})
+    changes = diff_snapshots(previous, current)
+    info.update(
+        rescored=int((rescore | (position < 0)).sum()),
+        rematched=0 if insee is None else int((rematch | (position < 0)).sum()),
+        changes=change_counts(changes),
+        elapsed_s=round(time.perf_counter() - start, 3),
+    )
+    entry = save_snapshot(table, keys, hashes, info, directory)
+    if write_cache and Path(insee_path) == INSEE_PATH:
+        # L'artefact du tableau de bord est indexé sur cities_insee.csv : inutile pour un autre fichier
+        write_artifact(table, csv_path)
+    return table, entry, changes
+
+
+def _pick(df, column, rows, numeric=False):
+    """`df[column]` at positions `rows`, missing (NaN / None) where rows is -1."""
+    dtype = np.float64 if numeric else object
+    out = np.full(len(rows), np.nan if numeric else None, dtype=dtype)
+    found = rows >= 0
+    if found.any():
+        out[found] = np.asarray(df[column], dtype=dtype)[rows[found]]
+    return out
+
+
+def diff_snapshots(old, new):
+    """Communes that are new, removed, changed priority class or revenue between snapshots `old` and `new`.
+
+    Both frames need the cleCommune column; `old` may be None (everything is new).
+    """
+    if old is None:
+        old = new.iloc[:0]
+    old_keys, new_keys = pd.Index(old[KEY_COLUMN]), pd.Index(new[KEY_COLUMN])
+    old_pos = old_keys.get_indexer(new_keys)
+    removed = np.flatnonzero(new_keys.get_indexer(old_keys) < 0)
+    added = np.flatnonzero(old_pos < 0)
+    matched = np.flatnonzero(old_pos >= 0)
+    before = old_pos[matched]
+
+    priority = (np.asarray(new["priorite"], dtype=object)[matched]
+                != np.asarray(old["priorite"], dtype=object)[before])
+    revenue = ~priority & (new["revenuAnnuel"].to_numpy(dtype=np.int64)[matched]
+                           != old["revenuAnnuel"].to_numpy(dtype=np.int64)[before])
+    new_rows = np.concatenate([added, np.full(len(removed), -1), matched[priority], matched[revenue]])
+    old_rows = np.concatenate([np.full(len(added), -1), removed, before[priority], before[revenue]])
+    kind = np.repeat(np.arange(len(CHANGE_LABELS)), [len(added), len(removed), priority.sum(), revenue.sum()])
+
+    out = pd.DataFrame({"changement": pd.Categorical.from_codes(kind, CHANGE_LABELS)})
+    for col in ("nom", "departement", "region"):
+        out[col] = np.where(new_rows >= 0, _pick(new, col, new_rows), _pick(old, col, old_rows))
+    for col, label in (("priorite", "priorite"), ("score", "score"), ("revenuAnnuel", "revenu")):
+        numeric = col != "priorite"
+        out[f"{label}Avant"] = _pick(old, col, old_rows, numeric)
+        out[f"{label}Apres"] = _pick(new, col, new_rows, numeric)
+    out["ecartRevenu"] = np.nan_to_num(out["revenuApres"].to_numpy()) - np.nan_to_num(out["revenuAvant"].to_numpy())
+    # Seules les lignes modifiées sont triées : par type de changement puis écart de revenu décroissant
+    order = np.lexsort((-np.abs(out["ecartRevenu"].to_numpy()), kind))
+    return out.iloc[order].reset_index(drop=True)
+
+
+def diff_versions(old, new, directory):
+    """Changes between two stored versions of `directory`."""
+    return diff_snapshots(load_snapshot(directory, old)[0], load_snapshot(directory, new)[0])
+
+
+def change_counts(changes):
+    """Number of communes per kind of change, plus the net revenue change."""
+    counts = changes["changement"].value_counts().reindex(CHANGE_LABELS, fill_value=0)
+    return {**{label: int(n) for label, n in counts.items()}, "ecartRevenu": int(changes["ecartRevenu"].sum())}
+
+
+def priority_transitions(changes):
+    """Priority class before (rows) x after (columns) of the communes whose class changed."""
+    moved = changes[changes["changement"] == "priorité"]
+    return pd.crosstab(
+        pd.Categorical(moved["prioriteAvant"], PRIORITIES),
+        pd.Categorical(moved["prioriteApres"], PRIORITIES),
+        rownames=["avant"], colnames=["après"], dropna=False,
+    )
+
+
+def describe(changes):
+    """Text summary of a diff: counts per kind of change and priority transitions."""
+    counts = change_counts(changes)
+    lines = [", ".join(f"{counts[label]:,} {label}" for label in CHANGE_LABELS)
+             + f" ; écart de revenu net {counts['ecartRevenu']:+,} €/an"]
+    if counts["priorité"]:
+        lines.append(priority_transitions(changes).to_string())
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the versioned scored snapshots and report what changed.")
+    parser.add_argument("input", nargs="?", default=str(CSV_PATH), help="source CSV (default: data.csv)")
+    parser.add_argument("--dir", help="snapshot directory (default: snapshots/<input name>)")
+    parser.add_argument("--list", action="store_true", help="list the stored versions and exit")
+    parser.add_argument("--diff", nargs=2, type=int, metavar=("OLD", "NEW"), help="compare two stored versions")
+    parser.add_argument("-o", "--output", help="write the changed communes (.csv, .parquet, .feather or .xlsx)")
+    args = parser.parse_args(argv)
+
+    directory = Path(args.dir) if args.dir else snapshot_dir(args.input)
+    if args.list:
+        for e in list_snapshots(directory):
+            print(f"v{e['version']:<4} {e['created']}  {e['rows']:>9,} communes  {e['rescored']:>9,} recalculées  "
+                  f"{e['elapsed_s']:.2f}s")
+        return 0
+    if args.diff:
+        changes = diff_versions(*args.diff, directory)
+    else:
+        from validation import ValidationError, summary
+
+        try:
+            _, entry, changes = refresh(args.input, directory)
+        except ValidationError as e:
+            print(summary(e.report))
+            print(f"ERROR: {args.input} failed validation, no snapshot written")
+            return 2
+        if changes is None:
+            print(f"No change since v{entry['version']} ({entry['created']})")
+            return 0
+        print(f"v{entry['version']}: {entry['rows']:,} communes, {entry['rescored']:,} rescored, "
+              f"{entry['rematched']:,} matched to INSEE in {entry['elapsed_s']:.2f}s")
+    print(describe(changes))
+    if args.output:
+        from pipeline import write_table
+
+        write_table(changes, args.output)
+        print(f"Saved {len(changes):,} changed communes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
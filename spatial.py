@@ -0,0 +1,165 @@
+"""spatial.py
+Spatial index over commune coordinates (lat/lon in degrees).
+
+Points are bucketed into a regular lat/lon grid; cell keys are laid out row by
+row so the cells a query needs in one latitude band form a single contiguous
+slice of the sorted keys. Batched queries expand every (query, candidate) pair
+in one vectorized pass, filter them with the exact haversine distance and
+aggregate with `np.bincount`, chunk by chunk to keep memory bounded.
+"""
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+CATCHMENT_COLUMNS = ("clientsPotentiels", "revenuAnnuel", "population")
+
+# zoneChalandise est un indice sans unité (100-600) : converti en rayon de 4 à 24 km
+ZONE_KM_PAR_UNITE = 0.04
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (broadcasts like NumPy)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def zone_radius_km(df):
+    """Catchment radius (km) of each commune, from its zoneChalandise index."""
+    return df["zoneChalandise"].to_numpy(dtype=np.float64) * ZONE_KM_PAR_UNITE
+
+
+class SpatialIndex:
+    def __init__(self, lat, lon, cell_deg=0.1, df=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.n = len(self.lat)
+        self.df = df
+        self.cell_deg = cell_deg
+
+        self._lat0 = np.floor(self.lat.min()) if self.n else 0.0
+        self._lon0 = np.floor(self.lon.min()) if self.n else 0.0
+        iy = self._cell(self.lat, self._lat0)
+        ix = self._cell(self.lon, self._lon0)
+        self._ny = int(iy.max()) + 1 if self.n else 1
+        self._nx = int(ix.max()) + 1 if self.n else 1
+        keys = iy * self._nx + ix
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    @classmethod
+    def from_frame(cls, df, cell_deg=0.1):
+        return cls(df["lat"].to_numpy(), df["lon"].to_numpy(), cell_deg=cell_deg, df=df)
+
+    def _cell(self, values, origin):
+        return np.floor((values - origin) / self.cell_deg).astype(np.int64)
+
+    # --- Paires (requête, commune) ------------------------------------------
+
+    def _pairs(self, qlat, qlon, radius):
+        """All (query, point, distance) with distance <= radius, for one chunk."""
+        r_deg = np.degrees(radius / EARTH_RADIUS_KM)
+        lat_lo, lat_hi = qlat - r_deg, qlat + r_deg
+        # Demi-largeur en longitude calculée à la latitude la plus éloignée de l'équateur
+        max_abs_lat = np.minimum(np.maximum(np.abs(lat_lo), np.abs(lat_hi)), 89.9)
+        lon_half = np.minimum(r_deg / np.cos(np.radians(max_abs_lat)), 180.0)
+
+        iy0 = np.clip(self._cell(lat_lo, self._lat0), 0, self._ny - 1)
+        iy1 = np.clip(self._cell(lat_hi, self._lat0), 0, self._ny - 1)
+        ix0 = np.clip(self._cell(qlon - lon_half, self._lon0), 0, self._nx - 1)
+        ix1 = np.clip(self._cell(qlon + lon_half, self._lon0), 0, self._nx - 1)
+
+        # Une tranche de clés triées par (requête, bande de latitude)
+        bands = iy1 - iy0 + 1
+        band_q = np.repeat(np.arange(len(qlat)), bands)
+        band_iy = iy0[band_q] + np.arange(bands.sum()) - np.repeat(np.cumsum(bands) - bands, bands)
+        lo = np.searchsorted(self._keys, band_iy * self._nx + ix0[band_q], side="left")
+        hi = np.searchsorted(self._keys, band_iy * self._nx + ix1[band_q], side="right")
+
+        counts = hi - lo
+        q = np.repeat(band_q, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+        p = self._order[offsets]
+        d = haversine_km(qlat[q], qlon[q], self.lat[p], self.lon[p])
+        keep = d <= radius[q]
+        return q[keep], p[keep], d[keep]
+
+    def iter_pairs(self, lat, lon, radius_km, chunk_size=1024):
+        """Yield (start, query_ids, point_ids, distances) per chunk of queries.
+
+        `query_ids` are relative to `start`; `radius_km` is a scalar or one value per query.
+        """
+        qlat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        qlon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        radius = np.broadcast_to(np.asarray(radius_km, dtype=np.float64), qlat.shape)
+        for start in range(0, len(qlat), chunk_size):
+            end = start + chunk_size
+            q, p, d = self._pairs(qlat[start:end], qlon[start:end], radius[start:end])
+            yield start, q, p, d
+
+    def pairs_within(self, lat, lon, radius_km, chunk_size=1024):
+        """(query_ids, point_ids, distances) for every point within radius of every query.
+
+        Pairs come out grouped by query (`query_ids` is non-decreasing).
+        """
+        parts = [(q + start, p, d) for start, q, p, d in self.iter_pairs(lat, lon, radius_km, chunk_size)]
+        if not parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        return tuple(np.concatenate(a) for a in zip(*parts))
+
+    # --- Requêtes ------------------------------------------------------------
+
+    def within(self, lat, lon, radius_km):
+        """Positions of the points within `radius_km` of one point, nearest first, and their distances."""
+        _, p, d = self.pairs_within(lat, lon, radius_km)
+        order = np.argsort(d, kind="stable")
+        return p[order], d[order]
+
+    def neighbours(self, i, radius_km):
+        """Communes within `radius_km` of commune `i` (itself excluded)."""
+        p, d = self.within(self.lat[i], self.lon[i], radius_km)
+        keep = p != i
+        return p[keep], d[keep]
+
+    def knn(self, lat, lon, k, start_radius_km=5.0):
+        """k nearest points for each query: (positions, distances), both shaped (m, k)."""
+        qlat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        qlon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        m, k = len(qlat), min(k, self.n)
+        idx = np.full((m, k), -1, dtype=np.int64)
+        dist = np.full((m, k), np.inf)
+        pending = np.arange(m)
+        radius = np.full(m, float(start_radius_km))
+        max_radius = np.pi * EARTH_RADIUS_KM
+
+        while pending.size and k:
+            q, p, d = self.pairs_within(qlat[pending], qlon[pending], radius[pending])
+            enough = (np.bincount(q, minlength=len(pending)) >= k) | (radius[pending] >= max_radius)
+            sel = enough[q]
+            q, p, d = q[sel], p[sel], d[sel]
+            order = np.lexsort((d, q))
+            q, p, d = q[order], p[order], d[order]
+            rank = np.arange(len(q)) - np.searchsorted(q, q, side="left")
+            top = rank < k
+            rows = pending[q[top]]
+            idx[rows, rank[top]] = p[top]
+            dist[rows, rank[top]] = d[top]
+
+            pending = pending[~enough]
+            radius[pending] *= 2
+        return idx, dist
+
+    def catchment(self, lat, lon, radius_km, columns=CATCHMENT_COLUMNS, chunk_size=1024):
+        """Totals of `columns` (from the indexed frame) within radius of each query point."""
+        qlat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        m = len(qlat)
+        values = {col: self.df[col].to_numpy(dtype=np.float64) for col in columns}
+        out = {"nbCommunes": np.zeros(m, dtype=np.int64)}
+        out.update({col: np.zeros(m) for col in columns})
+        for start, q, p, _ in self.iter_pairs(qlat, lon, radius_km, chunk_size):
+            size = min(chunk_size, m - start)
+            out["nbCommunes"][start:start + size] = np.bincount(q, minlength=size)
+            for col, v in values.items():
+                out[col][start:start + size] = np.bincount(q, weights=v[p], minlength=size)
+        return pd.DataFrame(out)
@@ -0,0 +1,78 @@
+"""territories.py
+Greedy allocation of communes into non-overlapping franchise territories.
+
+Seats are taken in priority order (A, then B, then C) and by decreasing
+revenue. Each seat claims every still-unassigned commune within its
+catchment radius (zoneChalandise, see `spatial.zone_radius_km`), so a commune
+is counted in at most one territory. Neighbour lists come from one batched
+`SpatialIndex.pairs_within` call; the greedy pass only slices them.
+"""
+import numpy as np
+import pandas as pd
+
+from spatial import SpatialIndex, zone_radius_km
+
+SEAT_PRIORITIES = ("A", "B", "C")
+TOTAL_COLUMNS = ("population", "clientsPotentiels", "revenuAnnuel")
+
+
+def allocate_territories(df, radius_km=None, seat_priorities=SEAT_PRIORITIES):
+    """Return (territories, assignment).
+
+    `territories` has one row per territory (seat commune, its priority and
+    the totals of its member communes); `assignment` gives, for each row of
+    `df`, the territory number or -1 when the commune is not covered.
+    """
+    n = len(df)
+    lat = df["lat"].to_numpy(dtype=np.float64)
+    lon = df["lon"].to_numpy(dtype=np.float64)
+    radius = zone_radius_km(df) if radius_km is None else np.broadcast_to(np.asarray(radius_km, dtype=np.float64), (n,))
+
+    # Voisins de chaque commune (CSR : membres de la zone du siège i = members[starts[i]:starts[i + 1]])
+    seats_q, members, _ = SpatialIndex(lat, lon).pairs_within(lat, lon, radius)
+    starts = np.searchsorted(seats_q, np.arange(n + 1))
+
+    priority = df["priorite"].astype(str).to_numpy()
+    revenue = df["revenuAnnuel"].to_numpy()
+    rank = np.full(n, len(seat_priorities))
+    for i, p in enumerate(seat_priorities):
+        rank[priority == p] = i
+    candidates = np.lexsort((np.arange(n), -revenue, rank))
+    candidates = candidates[rank[candidates] < len(seat_priorities)]
+
+    assignment = np.full(n, -1, dtype=np.int64)
+    seats = []
+    for seat in candidates.tolist():
+        if assignment[seat] >= 0:
+            continue
+        zone = members[starts[seat]:starts[seat + 1]]
+        assignment[zone[assignment[zone] < 0]] = len(seats)
+        seats.append(seat)
+
+    seats = np.asarray(seats, dtype=np.int64)
+    covered = assignment >= 0
+    territories = pd.DataFrame({
+        "siege": df["nom"].to_numpy()[seats],
+        "departement": df["departement"].to_numpy()[seats],
+        "priorite": priority[seats],
+        "rayonKm": radius[seats],
+        "lat": lat[seats],
+        "lon": lon[seats],
+        "nbCommunes": np.bincount(assignment[covered], minlength=len(seats)),
+    })
+    for col in TOTAL_COLUMNS:
+        territories[col] = np.bincount(
+            assignment[covered], weights=df[col].to_numpy(dtype=np.float64)[covered], minlength=len(seats)
+        ).astype(np.int64)
+    return territories, assignment
+
+
+def phase_totals(territories, seat_priorities=SEAT_PRIORITIES):
+    """Territory count and totals per seat priority (one row per deployment phase)."""
+    totals = territories.groupby("priorite", observed=True).agg(
+        nbTerritoires=("siege", "size"),
+        nbCommunes=("nbCommunes", "sum"),
+        clientsPotentiels=("clientsPotentiels", "sum"),
+        revenuAnnuel=("revenuAnnuel", "sum"),
+    )
+    return totals.reindex(list(seat_priorities), fill_value=0)
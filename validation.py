@@ -0,0 +1,277 @@
+"""validation.py
+Schema and data-quality rules for data.csv-schema communes tables.
+
+Every rule is a vectorized check over a chunk of rows returning the mask of
+violating rows. `validate()` runs them on an in-memory frame, and
+`validate_file()` streams CSV/Parquet/Feather input chunk by chunk, so the
+whole file is never held in memory; duplicate (nom, departement) pairs are
+found across chunks from 64-bit row hashes. The report is a JSON-ready dict
+with, for each rule, its severity, the number of violating rows and the first
+few row numbers (0-based, in file order).
+
+Rules with severity "error" make `check()` raise `ValidationError`: the cache
+build (dataset_cache.build) and the batch CLI (pipeline.py) call it before
+scoring, so bad rows never reach the scoring engine. "warning" rules (zero
+population, duplicates) are reported only: the engine handles them.
+
+    python validation.py data.csv -o validation.json
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pipeline import SOURCE_DTYPES, csv_separator
+
+CHUNK_SIZE = 200_000
+MAX_EXAMPLES = 10
+
+TEXT_COLUMNS = ("nom", "region", "departement")
+NUMERIC_COLUMNS = (
+    "population", "plus60ans", "pct_15_29", "pct_30_44", "pct_45_59", "pct_maison",
+    "pct_appartement", "revenuMedian", "tauxProprietaires", "zoneChalandise", "lat", "lon",
+)
+REQUIRED_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS
+SHARE_COLUMNS = ("plus60ans", "pct_15_29", "pct_30_44", "pct_45_59", "pct_maison", "pct_appartement", "tauxProprietaires")
+AGE_COLUMNS = ("plus60ans", "pct_15_29", "pct_30_44", "pct_45_59")
+
+# Emprises (lat min, lat max, lon min, lon max) : métropole et Corse, puis outre-mer
+FRANCE_BOXES = (
+    (41.3, 51.2, -5.3, 9.7),
+    (15.8, 16.6, -61.9, -60.9),    # Guadeloupe
+    (14.3, 14.95, -61.3, -60.75),  # Martinique
+    (2.0, 5.9, -54.7, -51.5),      # Guyane
+    (-21.45, -20.85, 55.2, 55.9),  # La Réunion
+    (-13.1, -12.6, 45.0, 45.35),   # Mayotte
+    (46.7, 47.2, -56.5, -56.1),    # Saint-Pierre-et-Miquelon
+    (17.8, 18.2, -63.2, -62.7),    # Saint-Martin, Saint-Barthélemy
+)
+
+
+class ValidationError(ValueError):
+    """Raised by check() when error rules are violated; `report` holds the full report."""
+
+    def __init__(self, report):
+        self.report = report
+        failed = ", ".join(f"{r['rule']} ({r['violations']})" for r in report["rules"]
+                           if r["severity"] == "error" and r["violations"])
+        super().__init__(f"{report['source']}: invalid rows: {failed}")
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    severity: str
+    description: str
+    check: object  # columns of a chunk -> bool mask of violating rows
+
+
+def _inside_france(lat, lon):
+    inside = np.zeros(len(lat), dtype=bool)
+    for lat_lo, lat_hi, lon_lo, lon_hi in FRANCE_BOXES:
+        inside |= (lat >= lat_lo) & (lat <= lat_hi) & (lon >= lon_lo) & (lon <= lon_hi)
+    return inside
+
+
+def _blank(values):
+    """Non-missing values that are empty once trimmed (Arrow kernels, no Python loop)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arr = pa.array(values.astype(object).where(values.notna(), None), type=pa.string(), from_pandas=True)
+    return pc.fill_null(pc.equal(pc.utf8_trim_whitespace(arr), ""), False).to_numpy(zero_copy_only=False)
+
+
+def _invalid_codes(values):
+    """Non-missing departement codes that are not 1-3 digits, 2A or 2B (checked once per distinct code)."""
+    codes, uniques = pd.factorize(values)
+    bad = ~pd.Series(uniques).astype(str).str.fullmatch(r"\d{1,3}|2[ABab]").to_numpy(dtype=bool)
+    return np.append(bad, False)[codes]
+
+
+def _any(cols, names, test):
+    out = test(cols[names[0]])
+    for name in names[1:]:
+        out |= test(cols[name])
+    return out
+
+
+# `cols` : colonnes numériques converties en float64 (NaN si absentes ou invalides), colonnes texte telles quelles.
+# Les comparaisons avec NaN sont fausses : les valeurs manquantes ne relèvent que de missing_value.
+RULES = (
+    Rule("missing_value", "error", "a required column is empty",
+         lambda cols: _any(cols, NUMERIC_COLUMNS, np.isnan) | _any(cols, TEXT_COLUMNS, lambda s: s.isna().to_numpy())),
+    Rule("empty_name", "error", "nom is blank",
+         lambda cols: _blank(cols["nom"])),
+    Rule("invalid_departement", "error", "departement is not a 1-3 digit code, 2A or 2B",
+         lambda cols: _invalid_codes(cols["departement"])),
+    Rule("share_out_of_range", "error", "a percentage column is outside [0, 100]",
+         lambda cols: _any(cols, SHARE_COLUMNS, lambda v: (v < 0) | (v > 100))),
+    Rule("housing_shares_sum", "error", "pct_maison + pct_appartement differs from 100 by more than 0.5",
+         lambda cols: np.abs(cols["pct_maison"] + cols["pct_appartement"] - 100) > 0.5),
+    Rule("age_shares_sum", "error", "plus60ans + pct_15_29 + pct_30_44 + pct_45_59 exceeds 100",
+         lambda cols: sum(cols[c] for c in AGE_COLUMNS) > 100.05),
+    Rule("outside_france", "error", "lat/lon outside metropolitan France and the overseas departments",
+         lambda cols: ~np.isnan(cols["lat"]) & ~np.isnan(cols["lon"]) & ~_inside_france(cols["lat"], cols["lon"])),
+    Rule("negative_population", "error", "population is negative",
+         lambda cols: cols["population"] < 0),
+    Rule("invalid_revenue", "error", "revenuMedian is not positive",
+         lambda cols: cols["revenuMedian"] <= 0),
+    Rule("invalid_catchment", "error", "zoneChalandise is not positive",
+         lambda cols: cols["zoneChalandise"] <= 0),
+    Rule("zero_population", "warning", "population is 0 (no clients, saturation undefined)",
+         lambda cols: cols["population"] == 0),
+)
+NOT_NUMERIC = Rule("not_numeric", "error", "a numeric column holds a non-numeric value", None)
+DUPLICATE = Rule("duplicate_commune", "warning", "the same (nom, departement) pair appears more than once", None)
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield the rows of a CSV, Parquet or Feather communes file, `chunk_size` at a time."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif suffix in (".feather", ".arrow"):
+        df = pd.read_feather(path)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(path, sep=csv_separator(path), encoding="utf-8-sig", chunksize=chunk_size,
+                               dtype=SOURCE_DTYPES)
+
+
+class _Report:
+    """Violation counts and example rows accumulated over chunks."""
+
+    def __init__(self, source):
+        self.source = str(source)
+        self.rows = 0
+        self.chunks = 0
+        self.missing_columns = []
+        self.counts = {}
+        self.examples = {}
+        self._hashes = []
+        self._start = time.perf_counter()
+
+    def add(self, rule, mask, offset=None):
+        """Count the rows of `mask` (positions relative to `offset`, default: the current chunk)."""
+        offset = self.rows if offset is None else offset
+        hits = np.flatnonzero(mask)
+        self.counts[rule.name] = self.counts.get(rule.name, 0) + len(hits)
+        examples = self.examples.setdefault(rule.name, [])
+        if len(examples) < MAX_EXAMPLES:
+            examples.extend((hits[:MAX_EXAMPLES - len(examples)] + offset).tolist())
+
+    def add_chunk(self, chunk):
+        missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+        if missing:
+            self.missing_columns = missing
+            self.rows += len(chunk)
+            self.chunks += 1
+            return
+        cols = {c: chunk[c] for c in TEXT_COLUMNS}
+        not_numeric = np.zeros(len(chunk), dtype=bool)
+        for c in NUMERIC_COLUMNS:
+            values = chunk[c]
+            if values.dtype.kind in "iufb":
+                cols[c] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                # Valeur présente mais non convertible en nombre
+                cols[c] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                not_numeric |= np.isnan(cols[c]) & values.notna().to_numpy()
+        self.add(NOT_NUMERIC, not_numeric)
+        with np.errstate(invalid="ignore"):
+            for rule in RULES:
+                self.add(rule, rule.check(cols))
+        self._hashes.append(pd.util.hash_pandas_object(chunk[["nom", "departement"]].astype(str), index=False).to_numpy())
+        self.rows += len(chunk)
+        self.chunks += 1
+
+    def finish(self):
+        if self._hashes:
+            hashes = np.concatenate(self._hashes)
+            _, first = np.unique(hashes, return_index=True)
+            seen = np.zeros(len(hashes), dtype=bool)
+            seen[first] = True
+            # Première occurrence exclue : seules les répétitions sont comptées
+            self.add(DUPLICATE, ~seen, offset=0)
+        rules = [NOT_NUMERIC, *RULES, DUPLICATE]
+        report = {
+            "source": self.source,
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "elapsed_s": round(time.perf_counter() - self._start, 4),
+            "missing_columns": self.missing_columns,
+            "rules": [
+                {"rule": r.name, "severity": r.severity, "description": r.description,
+                 "violations": int(self.counts.get(r.name, 0)), "examples": self.examples.get(r.name, [])}
+                for r in rules
+            ],
+        }
+        errors = bool(self.missing_columns) or any(
+            r["violations"] for r in report["rules"] if r["severity"] == "error")
+        report["ok"] = not errors
+        return report
+
+
+def validate(df, source="<dataframe>", chunk_size=CHUNK_SIZE):
+    """Report for an in-memory frame."""
+    report = _Report(source)
+    for start in range(0, max(len(df), 1), chunk_size):
+        report.add_chunk(df.iloc[start:start + chunk_size])
+    return report.finish()
+
+
+def validate_file(path, chunk_size=CHUNK_SIZE):
+    """Report for a CSV/Parquet/Feather file, read `chunk_size` rows at a time."""
+    report = _Report(path)
+    for chunk in iter_chunks(path, chunk_size):
+        report.add_chunk(chunk)
+    return report.finish()
+
+
+def check(df, source="<dataframe>"):
+    """Raise ValidationError if `df` violates an error rule; return the report otherwise."""
+    report = validate(df, source)
+    if not report["ok"]:
+        raise ValidationError(report)
+    return report
+
+
+def summary(report):
+    """One line per rule with violations, for logs and CI output."""
+    lines = [f"{report['source']}: {report['rows']:,} rows in {report['elapsed_s'] * 1000:.0f} ms"]
+    if report["missing_columns"]:
+        lines.append(f"  error    missing columns: {', '.join(report['missing_columns'])}")
+    for r in report["rules"]:
+        if r["violations"]:
+            lines.append(f"  {r['severity']:<8} {r['rule']}: {r['violations']:,} rows (e.g. {r['examples'][:5]})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a data.csv-schema communes file.")
+    parser.add_argument("input", nargs="?", default=str(Path(__file__).parent / "data.csv"))
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    report = validate_file(args.input, args.chunk_size)
+    print(summary(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=1, ensure_ascii=False), encoding="utf-8")
+        print(f"Saved report to {args.output}")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())